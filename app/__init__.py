@@ -1,13 +1,24 @@
-"""Compatibility module that re-exports the service layer helpers."""
-
-from app.services import (
-    fetch_linktree,
-    find_bulletin_link,
-    find_songbook_link,
-    download_songbook,
-    fetch_drive_folder,
-    extract_outline_file_id,
-    download_outline,
-    extract_pdf_link_from_google,
-    clean_google_drive_link,
-)
+"""Compatibility module that re-exports the service layer helpers.
+
+The helpers are imported on first access, so ``python -m app.main`` does not
+load the service layer before it has checked the bot token.
+"""
+import importlib
+
+__all__ = [
+    "fetch_linktree",
+    "find_bulletin_link",
+    "find_songbook_link",
+    "download_songbook",
+    "fetch_drive_folder",
+    "extract_outline_file_id",
+    "download_outline",
+    "extract_pdf_link_from_google",
+    "clean_google_drive_link",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return getattr(importlib.import_module("app.services"), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
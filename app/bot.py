@@ -1,19 +1,26 @@
+import asyncio
 import logging
 import os
-from typing import Callable, Tuple
+from typing import Awaitable, List, Tuple, TypeVar
 
-from telegram import Update
+from telegram import Message, Update
+from telegram.constants import ChatAction
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
-from app.services.downloads import download_songbook
-from app.services.drive import (
-    download_outline,
-    extract_pdf_link_from_google,
-    extract_outline_file_id,
-    fetch_drive_folder,
+from app.documents import (
+    DOCUMENTS,
+    DocumentSource,
+    resolve_archived_document,
+    resolve_document,
+    resolve_documents,
+    tenant_documents,
 )
-from app.services.linktree import fetch_linktree, find_bulletin_link, find_songbook_link
-from app.services.cache import CACHE
+from app.history import requested_date
+from app.services.metrics import COMMAND_SECONDS, COMMANDS_IN_PROGRESS
+from app.services.subscriptions import SUBSCRIPTIONS
+from app.services.upstream import CircuitOpenError
+from app.tenants import tenant_for_chat, use_tenant
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -21,6 +28,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+DEFAULT_STATUS_DELAY_SECONDS = 1.0
+# Telegram shows a chat action for about five seconds.
+CHAT_ACTION_INTERVAL_SECONDS = 4.5
+
+
+def _unavailable_text(exc: CircuitOpenError) -> str:
+    return (f"Sorry, {exc.upstream} isn't responding right now. "
+            f"Please try again in a few minutes.")
+
+
+async def _upload_indicator(message: Message, delay: float) -> None:
+    await asyncio.sleep(delay)
+    try:
+        while True:
+            await message.reply_chat_action(ChatAction.UPLOAD_DOCUMENT)
+            await asyncio.sleep(CHAT_ACTION_INTERVAL_SECONDS)
+    except TelegramError as exc:
+        logger.debug("Could not show upload indicator: %s", exc)
+
+
+async def _with_upload_indicator(message: Message, work: Awaitable[T]) -> T:
+    """Await ``work``, showing "sending a file..." if it takes longer than STATUS_DELAY_SECONDS.
+
+    Cached documents arrive before the delay, so they cost a single API call.
+    """
+    delay = float(os.getenv("STATUS_DELAY_SECONDS", DEFAULT_STATUS_DELAY_SECONDS))
+    indicator = asyncio.ensure_future(_upload_indicator(message, delay))
+    try:
+        return await work
+    finally:
+        indicator.cancel()
+
 
 def _get_message(update: Update):
     if update.message is None:
@@ -34,14 +75,17 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if message is None:
         return
 
-    linktree_url = os.getenv("LINKTREE_URL", "")
+    tenant = tenant_for_chat(message.chat_id)
+    linktree_url = tenant.linktree_url or ""
     linktree_text = f"\nVisit our Linktree: {linktree_url}" if linktree_url else ""
     await message.reply_text(
-        text=f"Hi! I'm the Bukit Arang Bulletin Bot.\n"
+        text=f"Hi! I'm the {tenant.name} Bulletin Bot.\n"
         f"Use /bulletin to get the latest Sunday Bulletin.\n"
         f"Use /songbook to get the latest Songbook.\n"
         f"Use /outline for the Sermon Outline (PDF).\n"
-        f"Use /outline_doc for the Sermon Outline (DOCX).{linktree_text}"
+        f"Use /outline_doc for the Sermon Outline (DOCX).\n"
+        f"Use /all to get all of them at once.\n"
+        f"Use /subscribe to be sent new documents as soon as they are out.{linktree_text}"
     )
 
 
@@ -50,200 +94,153 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if message is None:
         return
 
-    linktree_url = os.getenv("LINKTREE_URL", "")
+    tenant = tenant_for_chat(message.chat_id)
+    linktree_url = tenant.linktree_url or ""
     linktree_text = f"\nLinktree: {linktree_url}" if linktree_url else ""
+    document_lines = "".join(
+        f"/{source.kind} - {source.description}\n" for source in tenant_documents(tenant))
     await message.reply_text(
         f"Available commands:\n"
         f"/start - Start the bot\n"
-        f"/bulletin - Download the latest Sunday Bulletin\n"
-        f"/songbook - Download the latest Songbook\n"
-        f"/outline - Download the Sermon Outline (PDF)\n"
-        f"/outline_doc - Download the Sermon Outline (DOCX)\n"
+        f"{document_lines}"
+        f"/all - Get every document at once\n"
+        f"Add a date or a week offset for an earlier one, e.g. /bulletin 2026-10-11 or /bulletin -1\n"
+        f"/subscribe [{'|'.join(DOCUMENTS)}] - Get new documents automatically\n"
+        f"/unsubscribe - Stop automatic updates\n"
         f"/help - Show this help message{linktree_text}"
     )
 
 
-async def bulletin(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    message = _get_message(update)
-    if message is None:
-        return
-
-    STATUS_MESSAGE_FETCHING = "Fetching the latest bulletin... please wait."
-    STATUS_MESSAGE_SENDING = "Sending bulletin..."
-    STATUS_MESSAGE_NOT_FOUND = "Sorry, I couldn't find the 'Sunday Bulletin'."
-    STATUS_MESSAGE_ERROR = "An error occurred while fetching the bulletin. Please try again later."
+def document_command(source: DocumentSource):
+    """Build the command handler that sends ``source`` to the requesting chat.
 
-    status_message = await message.reply_text(STATUS_MESSAGE_FETCHING)
+    An optional argument (a date or a week offset) sends that week's version
+    from the history instead of the latest one.
+    """
+    messages = source.messages
 
-    try:
-        html = fetch_linktree()
+    async def command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        with COMMAND_SECONDS.time(command=source.kind), \
+                COMMANDS_IN_PROGRESS.track_inprogress(command=source.kind):
+            await answer(update, context)
 
-        link = find_bulletin_link(html)
-        if not link:
-            await status_message.edit_text(STATUS_MESSAGE_NOT_FOUND)
+    async def answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = _get_message(update)
+        if message is None:
             return
 
-        direct_link = CACHE.get_direct_link(link)
-        if not direct_link:
-            logger.info(f"Direct link not in cache, extracting for {link}")
-            direct_link = extract_pdf_link_from_google(link)
-            if direct_link:
-                CACHE.set_direct_link(link, direct_link)
-                logger.info(f"Cached direct link: {direct_link}")
-
-        if direct_link:
-            await status_message.edit_text(STATUS_MESSAGE_SENDING)
+        tenant = tenant_for_chat(message.chat_id)
+        day = None
+        if context.args:
             try:
-                await message.reply_document(document=direct_link)
-                await status_message.delete()
+                with use_tenant(tenant):
+                    day = requested_date(source.kind, context.args[0])
+            except ValueError:
+                await message.reply_text(
+                    f"Use /{source.kind} for the latest one, /{source.kind} 2026-10-11 "
+                    f"for a given Sunday or /{source.kind} -1 for the week before.")
                 return
-            except Exception as e:
-                logger.error(f"Failed to send direct link: {e}")
-                await status_message.edit_text(STATUS_MESSAGE_ERROR)
 
-    except Exception as e:
-        logger.error(f"Error in bulletin_new command: {e}")
-        await status_message.edit_text(STATUS_MESSAGE_ERROR)
-
-
-async def songbook(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    message = _get_message(update)
-    if message is None:
-        return
+        if day is None:
+            work = resolve_document(source, message.reply_document, tenant=tenant)
+        else:
+            work = resolve_archived_document(source, message.reply_document, day, tenant=tenant)
+        try:
+            resolution = await _with_upload_indicator(message, work)
+        except CircuitOpenError as exc:
+            logger.warning("Skipping %s command, %s", source.kind, exc)
+            await message.reply_text(_unavailable_text(exc))
+            return
+        except Exception as exc:
+            logger.error("Error in %s command: %s", source.kind, exc)
+            await message.reply_text(messages.error)
+            return
 
-    STATUS_MESSAGE_FETCHING = "Fetching the latest songbook..."
-    STATUS_MESSAGE_SENDING = "Sending songbook..."
-    STATUS_MESSAGE_NOT_FOUND = "Sorry, I couldn't find the 'Songbook'."
-    STATUS_MESSAGE_ERROR = "An error occurred while fetching the songbook. Please try again later."
+        if not resolution.identity and day is not None:
+            await message.reply_text(messages.not_archived.format(date=day.isoformat()))
+        elif not resolution.identity:
+            await message.reply_text(messages.not_found)
+        elif not resolution.file_id:
+            await message.reply_text(messages.error)
 
-    status_message = await message.reply_text(STATUS_MESSAGE_FETCHING)
+    command.__name__ = source.kind
+    return command
 
-    try:
-        html = fetch_linktree()
 
-        link = find_songbook_link(html)
-        if not link:
-            await status_message.edit_text(STATUS_MESSAGE_NOT_FOUND)
+async def all_documents(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send every registered document as one media group."""
+    with COMMAND_SECONDS.time(command="all"), COMMANDS_IN_PROGRESS.track_inprogress(command="all"):
+        message = _get_message(update)
+        if message is None:
             return
 
-        cached_file_id = CACHE.get_file_id_for_url(link)
-        if cached_file_id:
-            await status_message.edit_text(STATUS_MESSAGE_SENDING)
-            await message.reply_document(document=cached_file_id)
-            await status_message.delete()
+        tenant = tenant_for_chat(message.chat_id)
+        try:
+            resolutions = await _with_upload_indicator(message, resolve_documents(
+                tenant_documents(tenant), message.reply_media_group, message.reply_document,
+                tenant=tenant))
+        except CircuitOpenError as exc:
+            logger.warning("Skipping all command, %s", exc)
+            await message.reply_text(_unavailable_text(exc))
+            return
+        except Exception as exc:
+            logger.error("Error in all command: %s", exc)
+            await message.reply_text(
+                "An error occurred while fetching the documents. Please try again later.")
             return
 
-        filepath, filename = download_songbook(link)
-
-        await status_message.edit_text(STATUS_MESSAGE_SENDING)
-        with open(filepath, "rb") as file_handle:
-            sent_message = await message.reply_document(
-                document=file_handle,
-                filename=filename,
-            )
-
-        if sent_message.document:
-            CACHE.set_file_id_for_name(filename, sent_message.document.file_id)
-            CACHE.set_file_id_for_url(link, sent_message.document.file_id)
+        missing = [resolution.kind for resolution in resolutions if not resolution.file_id]
+        if len(missing) == len(resolutions):
+            await message.reply_text("Sorry, I couldn't find any documents.")
+        elif missing:
+            await message.reply_text(f"Sorry, I couldn't find: {', '.join(missing)}.")
 
-        await status_message.delete()
 
-    except Exception as exc:
-        logger.error(f"Error in songbook command: {exc}")
-        await status_message.edit_text(STATUS_MESSAGE_ERROR)
+def _requested_kinds(context: ContextTypes.DEFAULT_TYPE) -> Tuple[List[str], List[str]]:
+    """Split command arguments into known document kinds and unknown words."""
+    args = [arg.lower().lstrip("/") for arg in (context.args or [])]
+    if not args:
+        return list(DOCUMENTS), []
+    known = [arg for arg in args if arg in DOCUMENTS]
+    unknown = [arg for arg in args if arg not in DOCUMENTS]
+    return known, unknown
 
 
-async def outline(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = _get_message(update)
     if message is None:
         return
 
-    STATUS_MESSAGE_FETCHING = "Fetching the sermon outline (PDF)... please wait."
-    STATUS_MESSAGE_SENDING = "Sending sermon outline (PDF)..."
-    STATUS_MESSAGE_NOT_FOUND = "Sorry, I couldn't find the sermon outline (PDF)."
-    STATUS_MESSAGE_ERROR = "An error occurred while fetching the outline. Please try again later."
-
-    status_message = await message.reply_text(STATUS_MESSAGE_FETCHING)
-
-    try:
-        html = fetch_drive_folder()
-
-        file_id = extract_outline_file_id(html, "application/pdf")
-        if not file_id:
-            await status_message.edit_text(STATUS_MESSAGE_NOT_FOUND)
-            return
-
-        view_url = f"https://drive.google.com/file/d/{file_id}/view?usp=sharing"
-        direct_link = CACHE.get_direct_link(view_url)
-        if not direct_link:
-            logger.info(
-                "Outline direct link not cached, extracting for %s", view_url)
-            direct_link = extract_pdf_link_from_google(view_url)
-            if direct_link:
-                CACHE.set_direct_link(view_url, direct_link)
-
-        if direct_link:
-            await status_message.edit_text(STATUS_MESSAGE_SENDING)
-            try:
-                await message.reply_document(document=direct_link)
-                await status_message.delete()
-                return
-            except Exception as exc:
-                logger.error("Failed to send outline link: %s", exc)
-                await status_message.edit_text(STATUS_MESSAGE_ERROR)
+    kinds, unknown = _requested_kinds(context)
+    if unknown:
+        await message.reply_text(
+            f"Unknown document: {', '.join(unknown)}. "
+            f"Choose from {', '.join(DOCUMENTS)}.")
+        return
 
-    except Exception as e:
-        logger.error(f"Error in outline command: {e}")
-        await status_message.edit_text(STATUS_MESSAGE_ERROR)
+    SUBSCRIPTIONS.subscribe(message.chat_id, kinds)
+    await message.reply_text(
+        f"Subscribed. I'll send new documents here as soon as they are out: "
+        f"{', '.join(SUBSCRIPTIONS.kinds_for(message.chat_id))}.\n"
+        f"Use /unsubscribe to stop.")
 
 
-async def outline_doc(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = _get_message(update)
     if message is None:
         return
 
-    STATUS_MESSAGE_FETCHING = "Fetching the sermon outline (DOC)... please wait."
-    STATUS_MESSAGE_SENDING = "Sending sermon outline (DOC)..."
-    STATUS_MEESSAGE_NOT_FOUND_ERROR = "Sorry, I could not find the sermon outline (DOC)."
-    STATUS_MESSAGE_ERROR = "An error occurred while fetching the outline. Please try again later."
-
-    status_message = await message.reply_text(STATUS_MESSAGE_FETCHING)
-
-    try:
-        html = fetch_drive_folder()
-
-        file_id = extract_outline_file_id(html, "wordprocessingml")
-        if not file_id:
-            # Try msword just in case
-            file_id = extract_outline_file_id(html, "msword")
-
-        if not file_id:
-            await status_message.edit_text(STATUS_MEESSAGE_NOT_FOUND_ERROR)
-            return
-
-        cached_drive_file_id = CACHE.get_file_id_for_drive_id(file_id)
-        if cached_drive_file_id:
-            logger.info("Using cached file_id for Drive id %s", file_id)
-            await status_message.edit_text(STATUS_MESSAGE_SENDING)
-            await message.reply_document(document=cached_drive_file_id)
-            await status_message.delete()
-            return
-
-        filepath, filename = download_outline(
-            file_id, filename_prefix="outline_doc")
-
-        await status_message.edit_text(STATUS_MESSAGE_SENDING)
-        with open(filepath, 'rb') as file_handle:
-            sent_message = await message.reply_document(document=file_handle, filename=filename)
-
-        if sent_message.document:
-            CACHE.set_file_id_for_name(
-                filename, sent_message.document.file_id)
-            CACHE.set_file_id_for_drive_id(
-                file_id, sent_message.document.file_id)
-
-        await status_message.delete()
+    kinds, unknown = _requested_kinds(context)
+    if unknown:
+        await message.reply_text(
+            f"Unknown document: {', '.join(unknown)}. "
+            f"Choose from {', '.join(DOCUMENTS)}.")
+        return
 
-    except Exception as e:
-        logger.error(f"Error in outline_doc command: {e}")
-        await status_message.edit_text(STATUS_MESSAGE_ERROR)
+    removed = SUBSCRIPTIONS.unsubscribe(message.chat_id, kinds)
+    if not removed:
+        await message.reply_text("You weren't subscribed to those documents.")
+        return
+    remaining = SUBSCRIPTIONS.kinds_for(message.chat_id)
+    remaining_text = f" Still subscribed to: {', '.join(remaining)}." if remaining else ""
+    await message.reply_text(f"Unsubscribed from {', '.join(removed)}.{remaining_text}")
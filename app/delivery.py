@@ -0,0 +1,157 @@
+"""Helpers for resolving documents and delivering them through Telegram.
+
+Every helper takes a ``send`` coroutine with the signature of
+``Message.reply_document`` / ``Bot.send_document`` (bound to a chat), so the
+same code path serves user replies and uploads to the cache chat.
+"""
+import logging
+import os
+from typing import Awaitable, Callable, Optional, Sequence, Tuple
+
+from telegram import Message
+
+from app.services.cache import CACHE
+from app.services.downloads import drive_file_id
+from app.services.drive import extract_pdf_link_from_google_async
+from app.services.metrics import track_stage
+from app.services.singleflight import INFLIGHT
+
+logger = logging.getLogger(__name__)
+
+SendDocument = Callable[..., Awaitable[Message]]
+SendMediaGroup = Callable[..., Awaitable[Sequence[Message]]]
+Download = Callable[[], Awaitable[Tuple[str, str]]]
+
+
+def drive_view_url(drive_id: str) -> str:
+    return f"https://drive.google.com/file/d/{drive_id}/view?usp=sharing"
+
+
+def cached_file_id_for_link(link: str) -> Optional[str]:
+    """Return the file_id sent for a Linktree link, or for the Drive file behind it."""
+    file_id = CACHE.get_file_id_for_url(link)
+    if file_id:
+        return file_id
+    drive_id = drive_file_id(link)
+    return CACHE.get_file_id_for_drive_id(drive_id) if drive_id else None
+
+
+def remember_file_id_for_link(link: str, file_id: str) -> None:
+    """Record a sent file_id under both the link and its Drive id."""
+    CACHE.set_file_id_for_url(link, file_id)
+    drive_id = drive_file_id(link)
+    if drive_id:
+        CACHE.set_file_id_for_drive_id(drive_id, file_id)
+
+
+def forget_file_id_for_link(link: str, file_id: str) -> None:
+    """Drop a rejected file_id from both keys it was recorded under."""
+    CACHE.invalidate_file_id_for_url(link, file_id)
+    drive_id = drive_file_id(link)
+    if drive_id:
+        CACHE.invalidate_file_id_for_drive_id(drive_id, file_id)
+
+
+async def resolve_direct_link(url: str) -> Optional[str]:
+    """Extract and cache the direct PDF link for a Drive view URL."""
+    direct_link = await extract_pdf_link_from_google_async(url)
+    if direct_link:
+        CACHE.set_direct_link(url, direct_link)
+        logger.info("Cached direct link: %s", direct_link)
+    return direct_link
+
+
+async def send_direct_link(send: SendDocument, url: str, direct_link: str,
+                           from_cache: bool, flight_key: str) -> Message:
+    """Send a direct link; a rejected cached link is invalidated and re-resolved once."""
+    try:
+        with track_stage("telegram_send_link"):
+            return await send(document=direct_link)
+    except Exception as exc:
+        if not from_cache:
+            raise
+        logger.warning(
+            "Cached direct link for %s was rejected, re-resolving: %s", url, exc)
+
+    CACHE.invalidate_direct_link(url, direct_link)
+    fresh_link, _ = await INFLIGHT.do(flight_key, lambda: resolve_direct_link(url))
+    if not fresh_link:
+        raise RuntimeError(f"Could not re-resolve direct link for {url}")
+    with track_stage("telegram_send_link"):
+        return await send(document=fresh_link)
+
+
+async def send_cached_file_id(send: SendDocument, file_id: str) -> bool:
+    """Resend a cached Telegram file_id, returning False if Telegram rejects it."""
+    try:
+        with track_stage("telegram_send_cached"):
+            await send(document=file_id)
+        return True
+    except Exception as exc:
+        logger.warning("Cached file_id %s was rejected: %s", file_id, exc)
+        return False
+
+
+def content_checksum(filepath: str) -> str:
+    """Checksum of a downloaded file, which the file store names its blobs by.
+
+    Unlike the store's filename index this cannot be changed by another
+    tenant downloading a document under the same name.
+    """
+    return os.path.basename(filepath)
+
+
+def uploaded_file_id_for(filepath: str) -> Optional[str]:
+    """Return the file_id of an earlier upload with the same content as a downloaded file."""
+    return CACHE.get_file_id_for_hash(content_checksum(filepath))
+
+
+def remember_uploaded_file(filepath: str, filename: str, file_id: str) -> None:
+    """Record the file_id of an uploaded file under its name and content hash."""
+    CACHE.set_file_id_for_name(filename, file_id)
+    CACHE.set_file_id_for_hash(content_checksum(filepath), file_id)
+
+
+async def send_downloaded_file(send: SendDocument, filepath: str, filename: str) -> Optional[str]:
+    """Send a downloaded file, skipping the upload if its content was sent before."""
+    checksum = content_checksum(filepath)
+    known_file_id = CACHE.get_file_id_for_hash(checksum)
+    if known_file_id:
+        logger.info("Content of %s already uploaded, reusing file_id", filename)
+        if await send_cached_file_id(send, known_file_id):
+            CACHE.set_file_id_for_name(filename, known_file_id)
+            return known_file_id
+        CACHE.invalidate_file_id_for_hash(checksum, known_file_id)
+
+    with open(filepath, "rb") as file_handle, track_stage("telegram_upload"):
+        sent_message = await send(document=file_handle, filename=filename)
+
+    if not sent_message.document:
+        return None
+    file_id = sent_message.document.file_id
+    remember_uploaded_file(filepath, filename, file_id)
+    return file_id
+
+
+async def send_link_or_upload(send: SendDocument, url: str, flight_key: str,
+                              download: Download) -> Optional[str]:
+    """Send a Drive file by direct link and return its file_id.
+
+    If the direct link cannot be resolved, or Telegram cannot fetch it, the
+    file is downloaded with ``download`` and uploaded instead.
+    """
+    direct_link = CACHE.get_direct_link(url)
+    from_cache = direct_link is not None
+    if not direct_link:
+        logger.info("Direct link not in cache, extracting for %s", url)
+        direct_link, _ = await INFLIGHT.do(flight_key, lambda: resolve_direct_link(url))
+
+    if direct_link:
+        try:
+            sent_message = await send_direct_link(send, url, direct_link, from_cache, flight_key)
+            return sent_message.document.file_id if sent_message.document else None
+        except Exception as exc:
+            logger.warning("Telegram could not fetch %s, uploading it instead: %s", url, exc)
+
+    filepath, filename = await download()
+    return await send_downloaded_file(send, filepath, filename)
@@ -0,0 +1,559 @@
+"""Registry of the documents the bot serves and the staged resolver they share.
+
+Each ``DocumentSource`` declares where a document is listed, how to pick it
+out of that listing and how to download it. ``resolve_document`` runs every
+source through the same stages:
+
+``fetch``
+    Read the listing page from its snapshot cache.
+``locate``
+    Find the document's identity (a link or Drive id) in the memoised index.
+``cache``
+    Look up a Telegram file_id already recorded for the document.
+``send``
+    Resend that file_id.
+``deliver``
+    Send by direct link, or download and upload, once per document across
+    concurrent callers, and record the resulting file_id.
+
+Every stage is timed on the returned ``Resolution`` and in the
+``bulletin_bot_resolver_stage_seconds`` histogram.
+
+Every document that gets a file_id is recorded in the date-indexed
+``app.history`` archive; ``resolve_archived_document`` sends an earlier
+version from there without the ``fetch`` and ``locate`` stages.
+
+``resolve_documents`` resolves several documents at once for a single
+media-group message: the listing pages are fetched concurrently, each
+document is prepared in parallel (cached file_id, direct link or download)
+and everything goes out in one ``send_media_group`` call.
+"""
+import asyncio
+import contextlib
+import datetime
+import logging
+import time
+from dataclasses import dataclass, field, replace
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from telegram import InputMediaDocument
+
+from app import history
+from app.delivery import (
+    SendDocument,
+    SendMediaGroup,
+    cached_file_id_for_link,
+    content_checksum,
+    drive_view_url,
+    forget_file_id_for_link,
+    remember_file_id_for_link,
+    remember_uploaded_file,
+    resolve_direct_link,
+    send_cached_file_id,
+    send_downloaded_file,
+    send_link_or_upload,
+    uploaded_file_id_for,
+)
+from app.services.cache import CACHE
+from app.services.downloads import (
+    download_linked_file_async,
+    download_songbook_async,
+    drive_file_id,
+)
+from app.services.drive import (
+    download_outline_async,
+    fetch_drive_folder_snapshot,
+    find_outline_doc_file_id,
+    find_outline_pdf_file_id,
+)
+from app.services.linktree import fetch_linktree_snapshot, find_bulletin_link, find_songbook_link
+from app.services.metrics import RESOLVER_STAGE_SECONDS, track_stage
+from app.services.singleflight import INFLIGHT
+from app.services.snapshots import Snapshot
+from app.services.upstream import CircuitOpenError
+from app.tenants import Tenant, default_tenant, use_tenant
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DocumentMessages:
+    """User-facing texts for one document."""
+
+    not_found: str
+    error: str
+    announcement: str
+    not_archived: str
+
+
+@dataclass(frozen=True)
+class DocumentSource:
+    """Where a document is listed and how to fetch it.
+
+    ``listing_url`` picks the tenant's listing page for ``fetch``, ``locate``
+    returns the document's identity from that page, and ``view_url`` turns
+    that identity into the Drive link file_ids and direct links are cached
+    under. Documents Telegram can fetch by URL set ``send_as_link``; the rest
+    are always downloaded and uploaded.
+    """
+
+    kind: str
+    description: str
+    fetch: Callable[..., Awaitable[Snapshot]]
+    listing_url: Callable[[Tenant], Optional[str]]
+    locate: Callable[[str], Optional[str]]
+    download: Callable[[str], Awaitable[Tuple[str, str]]]
+    messages: DocumentMessages
+    view_url: Callable[[str], str] = lambda identity: identity
+    send_as_link: bool = True
+
+
+@dataclass
+class Resolution:
+    """Outcome of resolving one document, with per-stage timings in seconds."""
+
+    kind: str
+    identity: Optional[str] = None
+    file_id: Optional[str] = None
+    via: Optional[str] = None
+    checksum: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            RESOLVER_STAGE_SECONDS.observe(elapsed, document=self.kind, stage=name)
+
+    @property
+    def elapsed(self) -> float:
+        return sum(self.timings.values())
+
+
+DOCUMENTS: Dict[str, DocumentSource] = {}
+
+
+def register_document(source: DocumentSource) -> DocumentSource:
+    DOCUMENTS[source.kind] = source
+    return source
+
+
+register_document(DocumentSource(
+    kind="bulletin",
+    description="Download the latest Sunday Bulletin",
+    fetch=fetch_linktree_snapshot,
+    listing_url=lambda tenant: tenant.linktree_url,
+    locate=find_bulletin_link,
+    download=lambda link: download_linked_file_async(link, "bulletin.pdf"),
+    messages=DocumentMessages(
+        not_found="Sorry, I couldn't find the 'Sunday Bulletin'.",
+        error="An error occurred while fetching the bulletin. Please try again later.",
+        announcement="A new Sunday Bulletin is out.",
+        not_archived="Sorry, I don't have the Sunday Bulletin for {date}.",
+    ),
+))
+
+register_document(DocumentSource(
+    kind="songbook",
+    description="Download the latest Songbook",
+    fetch=fetch_linktree_snapshot,
+    listing_url=lambda tenant: tenant.linktree_url,
+    locate=find_songbook_link,
+    download=download_songbook_async,
+    send_as_link=False,
+    messages=DocumentMessages(
+        not_found="Sorry, I couldn't find the 'Songbook'.",
+        error="An error occurred while fetching the songbook. Please try again later.",
+        announcement="A new Songbook is out.",
+        not_archived="Sorry, I don't have the Songbook for {date}.",
+    ),
+))
+
+register_document(DocumentSource(
+    kind="outline",
+    description="Download the Sermon Outline (PDF)",
+    fetch=fetch_drive_folder_snapshot,
+    listing_url=lambda tenant: tenant.outline_folder_url,
+    locate=find_outline_pdf_file_id,
+    download=download_outline_async,
+    view_url=drive_view_url,
+    messages=DocumentMessages(
+        not_found="Sorry, I couldn't find the sermon outline (PDF).",
+        error="An error occurred while fetching the outline. Please try again later.",
+        announcement="A new Sermon Outline (PDF) is out.",
+        not_archived="Sorry, I don't have the sermon outline (PDF) for {date}.",
+    ),
+))
+
+register_document(DocumentSource(
+    kind="outline_doc",
+    description="Download the Sermon Outline (DOCX)",
+    fetch=fetch_drive_folder_snapshot,
+    listing_url=lambda tenant: tenant.outline_folder_url,
+    locate=find_outline_doc_file_id,
+    download=lambda drive_id: download_outline_async(drive_id, filename_prefix="outline_doc"),
+    view_url=drive_view_url,
+    send_as_link=False,
+    messages=DocumentMessages(
+        not_found="Sorry, I could not find the sermon outline (DOC).",
+        error="An error occurred while fetching the outline. Please try again later.",
+        announcement="A new Sermon Outline (DOCX) is out.",
+        not_archived="Sorry, I don't have the sermon outline (DOC) for {date}.",
+    ),
+))
+
+
+def tenant_documents(tenant: Tenant) -> List[DocumentSource]:
+    """The registered documents the tenant has a listing page for."""
+    return [source for source in DOCUMENTS.values() if source.listing_url(tenant)]
+
+
+async def locate_document(source: DocumentSource, revalidate: bool = False,
+                          resolution: Optional[Resolution] = None,
+                          tenant: Optional[Tenant] = None) -> Optional[str]:
+    """Return the current identity of a document, or None if it is not listed."""
+    resolution = resolution or Resolution(source.kind)
+    listing_url = source.listing_url(tenant or default_tenant())
+    if not listing_url:
+        return None
+    with resolution.stage("fetch"):
+        snapshot = await source.fetch(listing_url, revalidate=revalidate)
+    with resolution.stage("locate"):
+        resolution.identity = source.locate(snapshot.text)
+    return resolution.identity
+
+
+async def cached_document(source: DocumentSource,
+                          tenant: Optional[Tenant] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Return ``(identity, file_id)`` from the snapshot and file_id caches alone.
+
+    Nothing is sent and, while the listing snapshot is fresh, nothing is
+    fetched; ``file_id`` is None when the current document was never sent.
+    """
+    tenant = tenant or default_tenant()
+    identity = await locate_document(source, tenant=tenant)
+    if not identity:
+        return None, None
+    with use_tenant(tenant):
+        return identity, cached_file_id_for_link(source.view_url(identity))
+
+
+def _record_history(source: DocumentSource, resolution: Resolution) -> None:
+    if resolution.identity and resolution.file_id:
+        history.record(
+            source.kind, resolution.identity, resolution.file_id,
+            drive_id=drive_file_id(source.view_url(resolution.identity)),
+            checksum=resolution.checksum)
+
+
+async def _download(source: DocumentSource, identity: str) -> Tuple[str, str]:
+    """Download a document once for every caller that misses the cache at the same time."""
+    downloaded, _ = await INFLIGHT.do(
+        f"download:{source.kind}:{identity}", lambda: source.download(identity))
+    return downloaded
+
+
+async def _deliver(source: DocumentSource, send: SendDocument, identity: str,
+                   tenant: Tenant, resolution: Resolution) -> Optional[str]:
+    async def download() -> Tuple[str, str]:
+        filepath, filename = await _download(source, identity)
+        resolution.checksum = content_checksum(filepath)
+        return filepath, filename
+
+    view_url = source.view_url(identity)
+    if source.send_as_link:
+        file_id = await send_link_or_upload(
+            send, view_url, f"direct_link:{tenant.scoped(identity)}", download)
+    else:
+        filepath, filename = await download()
+        file_id = await send_downloaded_file(send, filepath, filename)
+    if file_id:
+        remember_file_id_for_link(view_url, file_id)
+    return file_id
+
+
+async def resolve_document(
+    source: DocumentSource,
+    send: SendDocument,
+    resend_cached: bool = True,
+    tenant: Optional[Tenant] = None,
+) -> Resolution:
+    """Run a tenant's document through the resolver stages and send it with ``send``.
+
+    With ``resend_cached`` False a file_id that is already known is returned
+    without sending anything, which is what the prefetch job wants.
+    """
+    tenant = tenant or default_tenant()
+    with use_tenant(tenant):
+        resolution = await _resolve_document(source, send, resend_cached, tenant)
+        _record_history(source, resolution)
+        return resolution
+
+
+async def _resolve_document(
+    source: DocumentSource,
+    send: SendDocument,
+    resend_cached: bool,
+    tenant: Tenant,
+) -> Resolution:
+    resolution = Resolution(source.kind)
+    try:
+        identity = await locate_document(source, resolution=resolution, tenant=tenant)
+        if not identity:
+            return resolution
+
+        view_url = source.view_url(identity)
+        with resolution.stage("cache"):
+            cached_file_id = cached_file_id_for_link(view_url)
+        if cached_file_id and not resend_cached:
+            resolution.file_id, resolution.via = cached_file_id, "cache"
+            return resolution
+        if cached_file_id:
+            with resolution.stage("send"):
+                if await send_cached_file_id(send, cached_file_id):
+                    resolution.file_id, resolution.via = cached_file_id, "cache"
+                    return resolution
+            forget_file_id_for_link(view_url, cached_file_id)
+
+        async def deliver() -> Optional[str]:
+            return await _deliver(source, send, identity, tenant, resolution)
+
+        with resolution.stage("deliver"):
+            file_id, shared = await INFLIGHT.do(f"upload:{tenant.scoped(identity)}", deliver)
+        resolution.file_id, resolution.via = file_id, "deliver"
+        if shared and file_id and resend_cached:
+            # A concurrent caller did the upload into its own chat.
+            resolution.via = "shared"
+            with resolution.stage("send"):
+                await send(document=file_id)
+        return resolution
+    finally:
+        logger.info(
+            "Resolved %s via %s in %.0fms (%s)",
+            tenant.scoped(source.kind), resolution.via or "nothing", resolution.elapsed * 1000,
+            ", ".join(f"{stage}={seconds * 1000:.0f}ms"
+                      for stage, seconds in resolution.timings.items()),
+        )
+
+
+@dataclass
+class PreparedDocument:
+    """A located document and what to put in the media group for it.
+
+    ``media`` is a cached file_id (``via="cache"``), a direct link Telegram
+    fetches itself (``via="link"``) or, with ``filepath`` set, a downloaded
+    file to upload (``via="upload"``).
+    """
+
+    source: DocumentSource
+    resolution: Resolution
+    media: Optional[str] = None
+    filepath: Optional[str] = None
+
+    @property
+    def view_url(self) -> str:
+        return self.source.view_url(self.resolution.identity)
+
+
+async def _download_for_group(prepared: PreparedDocument, reuse_upload: bool = True) -> None:
+    resolution = prepared.resolution
+    with resolution.stage("download"):
+        filepath, filename = await _download(prepared.source, resolution.identity)
+    resolution.checksum = content_checksum(filepath)
+    known_file_id = uploaded_file_id_for(filepath) if reuse_upload else None
+    if known_file_id:
+        prepared.filepath, prepared.media, resolution.via = None, known_file_id, "cache"
+    else:
+        prepared.filepath, prepared.media, resolution.via = filepath, filename, "upload"
+
+
+async def prepare_document(source: DocumentSource, tenant: Tenant) -> PreparedDocument:
+    """Locate a document and get it ready for a media group without sending it."""
+    prepared = PreparedDocument(source, Resolution(source.kind))
+    resolution = prepared.resolution
+    identity = await locate_document(source, resolution=resolution, tenant=tenant)
+    if not identity:
+        return prepared
+
+    with resolution.stage("cache"):
+        cached_file_id = cached_file_id_for_link(prepared.view_url)
+    if cached_file_id:
+        prepared.media, resolution.via = cached_file_id, "cache"
+        return prepared
+
+    if source.send_as_link:
+        direct_link = CACHE.get_direct_link(prepared.view_url)
+        if not direct_link:
+            with resolution.stage("link"):
+                direct_link, _ = await INFLIGHT.do(
+                    f"direct_link:{tenant.scoped(identity)}",
+                    lambda: resolve_direct_link(prepared.view_url))
+        if direct_link:
+            prepared.media, resolution.via = direct_link, "link"
+            return prepared
+
+    await _download_for_group(prepared)
+    return prepared
+
+
+def _documents(ready: Sequence[PreparedDocument],
+               stack: contextlib.ExitStack) -> List[Tuple[object, Optional[str]]]:
+    """Return ``(document, filename)`` pairs, opening the files to upload on ``stack``."""
+    documents = []
+    for prepared in ready:
+        if prepared.filepath:
+            documents.append((stack.enter_context(open(prepared.filepath, "rb")), prepared.media))
+        else:
+            documents.append((prepared.media, None))
+    return documents
+
+
+async def _send_group(send_group: SendMediaGroup, send: SendDocument,
+                      ready: Sequence[PreparedDocument]) -> None:
+    with contextlib.ExitStack() as stack:
+        for prepared in ready:
+            stack.enter_context(prepared.resolution.stage("deliver"))
+        documents = _documents(ready, stack)
+        with track_stage("telegram_send_group"):
+            if len(documents) == 1:
+                # Telegram only accepts media groups of two to ten items.
+                document, filename = documents[0]
+                messages = [await send(document=document, filename=filename)]
+            else:
+                messages = await send_group(media=[
+                    InputMediaDocument(document, filename=filename)
+                    for document, filename in documents])
+
+    for prepared, message in zip(ready, messages):
+        file_id = message.document.file_id if message.document else None
+        prepared.resolution.file_id = file_id
+        if not file_id:
+            continue
+        remember_file_id_for_link(prepared.view_url, file_id)
+        if prepared.filepath:
+            remember_uploaded_file(prepared.filepath, prepared.media, file_id)
+
+
+async def _prepare_documents(sources: Sequence[DocumentSource],
+                             tenant: Tenant) -> List[PreparedDocument]:
+    """Prepare every source, leaving the ones that failed out of the group.
+
+    Only when every source failed is an error raised: a CircuitOpenError if
+    that is what they all hit, otherwise the first other error.
+    """
+    outcomes = await asyncio.gather(
+        *(prepare_document(source, tenant) for source in sources), return_exceptions=True)
+    prepared_documents, failures = [], []
+    for source, outcome in zip(sources, outcomes):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            logger.warning("Could not prepare %s for the group: %s",
+                           tenant.scoped(source.kind), outcome)
+            failures.append(outcome)
+            outcome = PreparedDocument(source, Resolution(source.kind))
+        prepared_documents.append(outcome)
+    if failures and len(failures) == len(sources):
+        raise next((exc for exc in failures if not isinstance(exc, CircuitOpenError)), failures[0])
+    return prepared_documents
+
+
+async def resolve_documents(sources: Sequence[DocumentSource], send_group: SendMediaGroup,
+                            send: SendDocument,
+                            tenant: Optional[Tenant] = None) -> List[Resolution]:
+    """Resolve ``sources`` in parallel and send the ones found as one media group.
+
+    ``send_group`` has the signature of ``Message.reply_media_group``; ``send``
+    is used instead when only one document was found.
+
+    If Telegram rejects the group (it cannot fetch a direct link, or a cached
+    file_id has gone stale), the linked and cached documents are downloaded
+    and the group is sent once more as uploads.
+    """
+    tenant = tenant or default_tenant()
+    with use_tenant(tenant):
+        return await _resolve_documents(sources, send_group, send, tenant)
+
+
+async def _resolve_documents(sources: Sequence[DocumentSource], send_group: SendMediaGroup,
+                             send: SendDocument, tenant: Tenant) -> List[Resolution]:
+    started = time.perf_counter()
+    prepared_documents = await _prepare_documents(sources, tenant)
+    ready = [prepared for prepared in prepared_documents if prepared.media]
+
+    if ready:
+        try:
+            await _send_group(send_group, send, ready)
+        except Exception as exc:
+            if all(prepared.filepath for prepared in ready):
+                raise
+            logger.warning("Media group was rejected, uploading every document instead: %s", exc)
+            for prepared in ready:
+                if prepared.filepath:
+                    continue
+                if prepared.resolution.via == "link":
+                    CACHE.invalidate_direct_link(prepared.view_url, prepared.media)
+                else:
+                    forget_file_id_for_link(prepared.view_url, prepared.media)
+            # Upload even content sent before: its file_id may be the one rejected.
+            await asyncio.gather(*(_download_for_group(prepared, reuse_upload=False)
+                                   for prepared in ready if not prepared.filepath))
+            await _send_group(send_group, send, ready)
+
+    for prepared in prepared_documents:
+        _record_history(prepared.source, prepared.resolution)
+    resolutions = [prepared.resolution for prepared in prepared_documents]
+    logger.info(
+        "Resolved %d %s documents as a group in %.0fms (%s)",
+        len(ready), tenant.key, (time.perf_counter() - started) * 1000,
+        ", ".join(f"{resolution.kind}={resolution.via or 'nothing'}"
+                  for resolution in resolutions),
+    )
+    return resolutions
+
+
+async def resolve_archived_document(source: DocumentSource, send: SendDocument,
+                                    day: datetime.date,
+                                    tenant: Optional[Tenant] = None) -> Resolution:
+    """Send the version of a document recorded for ``day``'s service.
+
+    The listing page is not read: the recorded file_id is resent, and only if
+    Telegram rejects it is the recorded identity downloaded and uploaded
+    again. ``identity`` stays None when nothing was recorded for that date.
+    """
+    tenant = tenant or default_tenant()
+    resolution = Resolution(source.kind)
+    try:
+        with use_tenant(tenant):
+            await _resolve_archived_document(source, send, day, resolution)
+        return resolution
+    finally:
+        logger.info("Resolved %s for %s via %s in %.0fms", tenant.scoped(source.kind),
+                    day, resolution.via or "nothing", resolution.elapsed * 1000)
+
+
+async def _resolve_archived_document(source: DocumentSource, send: SendDocument,
+                                     day: datetime.date, resolution: Resolution) -> None:
+    with resolution.stage("history"):
+        entry = history.lookup(source.kind, day)
+    if entry is None:
+        return
+    resolution.identity = entry.identity
+
+    if entry.file_id:
+        with resolution.stage("send"):
+            if await send_cached_file_id(send, entry.file_id):
+                resolution.file_id, resolution.via = entry.file_id, "history"
+                return
+
+    with resolution.stage("deliver"):
+        filepath, filename = await _download(source, entry.identity)
+        resolution.file_id = await send_downloaded_file(send, filepath, filename)
+    resolution.via = "deliver"
+    if resolution.file_id:
+        history.save(replace(
+            entry, file_id=resolution.file_id, checksum=content_checksum(filepath)))
@@ -0,0 +1,129 @@
+"""Date-indexed archive of the document versions the bot has sent.
+
+Whenever a document is resolved, its identity (Linktree link or Drive id),
+Drive id, content checksum and Telegram file_id are recorded in CacheStore's
+``document_history`` namespace under ``<kind>:<date>``. The date is the
+Sunday service the version was first seen for, and ``<kind>:latest`` points
+at the newest one. Like every CacheStore key these are scoped per tenant, so
+callers wrap them in ``use_tenant``.
+
+A past version is then sent again from its file_id without reading Linktree
+or Drive.
+"""
+import datetime
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, replace
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from app.services.cache import CACHE
+
+logger = logging.getLogger(__name__)
+
+SERVICE_WEEKDAY = 6  # Sunday
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    """One recorded version of a document."""
+
+    kind: str
+    date: datetime.date
+    identity: str
+    drive_id: Optional[str] = None
+    checksum: Optional[str] = None
+    file_id: Optional[str] = None
+
+    def to_json(self) -> str:
+        record = asdict(self)
+        del record["kind"], record["date"]
+        return json.dumps(record)
+
+    @classmethod
+    def from_json(cls, kind: str, date: datetime.date, raw: str) -> "HistoryEntry":
+        return cls(kind=kind, date=date, **json.loads(raw))
+
+
+def _today() -> datetime.date:
+    # Dates follow the prefetch schedule's timezone unless set on their own.
+    timezone = os.getenv("HISTORY_TIMEZONE") or os.getenv("PREFETCH_TIMEZONE")
+    return datetime.datetime.now(ZoneInfo(timezone) if timezone else datetime.timezone.utc).date()
+
+
+def service_date(day: datetime.date) -> datetime.date:
+    """The service day (Sunday) on or after ``day``."""
+    return day + datetime.timedelta(days=(SERVICE_WEEKDAY - day.weekday()) % 7)
+
+
+def _key(kind: str, day: datetime.date) -> str:
+    return f"{kind}:{day.isoformat()}"
+
+
+def latest_date(kind: str) -> Optional[datetime.date]:
+    latest = CACHE.get_history(f"{kind}:latest")
+    return datetime.date.fromisoformat(latest) if latest else None
+
+
+def lookup(kind: str, day: datetime.date) -> Optional[HistoryEntry]:
+    """Return the version recorded for the service on or after ``day``."""
+    day = service_date(day)
+    raw = CACHE.get_history(_key(kind, day))
+    return HistoryEntry.from_json(kind, day, raw) if raw else None
+
+
+def save(entry: HistoryEntry) -> None:
+    CACHE.set_history(_key(entry.kind, entry.date), entry.to_json())
+    latest = latest_date(entry.kind)
+    if latest is None or entry.date >= latest:
+        CACHE.set_history(f"{entry.kind}:latest", entry.date.isoformat())
+
+
+def record(kind: str, identity: str, file_id: Optional[str], drive_id: Optional[str] = None,
+           checksum: Optional[str] = None) -> HistoryEntry:
+    """Record a resolved version, filling in what is now known about the current one.
+
+    A new identity is filed under the coming service date, replacing
+    whatever was recorded for that date (a corrected upload). The same
+    identity keeps its date.
+    """
+    latest = latest_date(kind)
+    current = lookup(kind, latest) if latest else None
+    if current is not None and current.identity == identity:
+        entry = current
+    else:
+        current = None
+        entry = HistoryEntry(kind, service_date(_today()), identity)
+
+    entry = replace(
+        entry,
+        drive_id=drive_id or entry.drive_id,
+        checksum=checksum or entry.checksum,
+        file_id=file_id or entry.file_id,
+    )
+    if entry != current:
+        if current is None:
+            logger.info("Recording %s %s for %s", kind, identity, entry.date)
+        save(entry)
+    return entry
+
+
+def requested_date(kind: str, argument: str) -> datetime.date:
+    """Turn a command argument into a service date.
+
+    Takes a date (``2026-10-11``) or a week offset counted back from the
+    newest recorded version (``-1`` or ``1`` for the week before). Raises
+    ValueError for anything else.
+    """
+    argument = argument.strip()
+    try:
+        return service_date(datetime.date.fromisoformat(argument))
+    except ValueError:
+        pass
+    weeks = abs(int(argument))
+    latest = latest_date(kind) or service_date(_today())
+    try:
+        return latest - datetime.timedelta(weeks=weeks)
+    except OverflowError:
+        raise ValueError(f"{argument} weeks back is out of range") from None
@@ -0,0 +1,86 @@
+"""Inline mode: ``@bot bulletin`` answered from cached Telegram file_ids.
+
+Each matching document becomes an ``InlineQueryResultCachedDocument``, so
+the user gets it with the single ``answerInlineQuery`` call and no upstream
+fetch. Documents whose current version was never sent are resolved into the
+tenant's cache chat (the regular path the prefetch job uses); whatever is
+ready within ``INLINE_RESOLVE_SECONDS`` is included and the rest keeps
+uploading in the background for the next query.
+"""
+import asyncio
+import functools
+import logging
+import os
+from typing import List, Optional
+
+from telegram import InlineQueryResultCachedDocument, InlineQueryResultsButton, Update
+from telegram.ext import ContextTypes
+
+from app.documents import DocumentSource, cached_document, resolve_document, tenant_documents
+from app.services.metrics import COMMAND_SECONDS, COMMANDS_IN_PROGRESS
+from app.tenants import Tenant, tenant_for_chat
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INLINE_CACHE_SECONDS = 30
+DEFAULT_INLINE_RESOLVE_SECONDS = 5.0
+
+
+def matching_documents(tenant: Tenant, query: str) -> List[DocumentSource]:
+    """Documents whose command or description contains the query; all for an empty one."""
+    query = query.strip().lower().lstrip("/")
+    return [source for source in tenant_documents(tenant)
+            if query in source.kind or query in source.description.lower()]
+
+
+async def _inline_file_id(context: ContextTypes.DEFAULT_TYPE, source: DocumentSource,
+                          tenant: Tenant) -> Optional[str]:
+    identity, file_id = await cached_document(source, tenant)
+    if file_id or not identity or tenant.cache_chat_id is None:
+        return file_id
+
+    send = functools.partial(
+        context.bot.send_document, tenant.cache_chat_id, disable_notification=True)
+    task = context.application.create_task(
+        resolve_document(source, send, resend_cached=False, tenant=tenant))
+    timeout = float(os.getenv("INLINE_RESOLVE_SECONDS", DEFAULT_INLINE_RESOLVE_SECONDS))
+    done, _ = await asyncio.wait({task}, timeout=timeout)
+    if not done:
+        logger.info("%s is still uploading, leaving it out of this answer",
+                    tenant.scoped(source.kind))
+        return None
+    return task.result().file_id
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query
+    if query is None:
+        return
+
+    with COMMAND_SECONDS.time(command="inline"), \
+            COMMANDS_IN_PROGRESS.track_inprogress(command="inline"):
+        tenant = tenant_for_chat(query.from_user.id)
+        sources = matching_documents(tenant, query.query)
+        file_ids = await asyncio.gather(
+            *(_inline_file_id(context, source, tenant) for source in sources),
+            return_exceptions=True)
+
+        results = []
+        for source, file_id in zip(sources, file_ids):
+            if isinstance(file_id, Exception):
+                logger.error("Inline lookup of %s failed: %s", tenant.scoped(source.kind), file_id)
+            elif file_id:
+                results.append(InlineQueryResultCachedDocument(
+                    id=source.kind,
+                    title=source.description,
+                    document_file_id=file_id,
+                ))
+
+        button = None
+        cache_time = int(os.getenv("INLINE_CACHE_SECONDS", DEFAULT_INLINE_CACHE_SECONDS))
+        if len(results) < len(sources):
+            # Don't let Telegram cache an incomplete answer; retry once uploads finish.
+            button = InlineQueryResultsButton(text="Open the bot to fetch it",
+                                              start_parameter="inline")
+            cache_time = 0
+        await query.answer(results, cache_time=cache_time, is_personal=True, button=button)
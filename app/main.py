@@ -1,5 +1,4 @@
-from app.bot import start, help_command, bulletin, songbook, outline, outline_doc
-from telegram.ext import ApplicationBuilder, CommandHandler
+from app.startup import first_update, mark, preload_caches, wait_for_caches
 from dotenv import load_dotenv
 import logging
 import os
@@ -26,30 +25,99 @@ def main():
         logger.error("TELEGRAM_BOT_TOKEN not found in environment variables.")
         return
 
-    application = ApplicationBuilder().token(token).post_init(post_init).build()
+    from app.webhook import missing_webhook_support
+    problem = missing_webhook_support()
+    if problem:
+        logger.error(problem)
+        sys.exit(1)
 
+    # The service layer, python-telegram-bot and the handlers are imported
+    # only once there is a token to run with.
+    from app.services.cache import open_persistent_cache
+    from app.services.metrics import register_health_check, start_metrics_server
+    from app.services.subscriptions import open_persistent_subscriptions
+    from app.tenants import load_tenants
+
+    load_tenants()
+    preload_caches(open_persistent_cache, open_persistent_subscriptions)
+    start_metrics_server()
+
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder, CommandHandler, InlineQueryHandler, TypeHandler
+
+    from app.bot import (
+        start,
+        help_command,
+        all_documents,
+        document_command,
+        subscribe,
+        unsubscribe,
+    )
+    from app.documents import DOCUMENTS
+    from app.inline import inline_query
+    from app.prefetch import schedule_prefetch
+    from app.watcher import schedule_watcher
+    from app.webhook import concurrent_updates, run_application
+
+    application = (
+        ApplicationBuilder()
+        .token(token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(concurrent_updates())
+        .build()
+    )
+    register_health_check("application", lambda: application.running)
+
+    application.add_handler(TypeHandler(Update, first_update, block=False), group=-1)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("bulletin", bulletin))
-    application.add_handler(CommandHandler("songbook", songbook))
-    application.add_handler(CommandHandler("outline", outline))
-    application.add_handler(CommandHandler("outline_doc", outline_doc))
+    for source in DOCUMENTS.values():
+        application.add_handler(CommandHandler(source.kind, document_command(source)))
+    application.add_handler(CommandHandler("all", all_documents))
+    application.add_handler(CommandHandler("subscribe", subscribe))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
+    application.add_handler(InlineQueryHandler(inline_query))
+
+    schedule_prefetch(application)
+    schedule_watcher(application)
+    mark("configured")
 
-    application.run_polling()
+    run_application(application)
 
 
 async def post_init(application):
     """Sets the bot commands for autosuggestion."""
     from telegram import BotCommand
+    from app.documents import DOCUMENTS
+    from app.services.executor import start_event_loop_lag_monitor
     commands = [
-        BotCommand("bulletin", "Download the latest Sunday Bulletin"),
-        BotCommand("songbook", "Download the latest Songbook"),
-        BotCommand("outline", "Download the Sermon Outline (PDF)"),
-        BotCommand("outline_doc", "Download the Sermon Outline (DOCX)"),
+        BotCommand(source.kind, source.description) for source in DOCUMENTS.values()
+    ] + [
+        BotCommand("all", "Get every document at once"),
+        BotCommand("subscribe", "Get new documents as soon as they are out"),
+        BotCommand("unsubscribe", "Stop automatic updates"),
         BotCommand("help", "Show available commands"),
         BotCommand("start", "Start the bot"),
     ]
     await application.bot.set_my_commands(commands)
+    start_event_loop_lag_monitor()
+    await wait_for_caches()
+    mark("ready")
+
+
+async def post_shutdown(application):
+    """Releases the shared HTTP client and flushes the persistent cache on SIGINT/SIGTERM."""
+    from app.services.cache import CACHE
+    from app.services.executor import shutdown_cpu_executor, stop_event_loop_lag_monitor
+    from app.services.http import close_async_client
+    from app.services.subscriptions import SUBSCRIPTIONS
+    stop_event_loop_lag_monitor()
+    await close_async_client()
+    shutdown_cpu_executor()
+    await wait_for_caches()
+    CACHE.close()
+    SUBSCRIPTIONS.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,68 @@
+"""Scheduled warm-up that resolves and uploads every document ahead of time.
+
+The job uploads each tenant's documents once to that tenant's private cache
+chat (``CACHE_CHAT_ID`` for the default tenant) and records the resulting
+Telegram file_ids under the same CacheStore keys the command handlers read,
+so user commands become a single cached ``reply_document``.
+"""
+import asyncio
+import functools
+import logging
+import os
+
+from telegram import Bot
+from telegram.ext import Application, ContextTypes
+
+from app.documents import resolve_document, tenant_documents
+from app.tenants import Tenant, all_tenants
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_CRON = "*/30 6-10 * * sun"
+
+
+async def _prefetch_tenant(bot: Bot, tenant: Tenant) -> None:
+    send = functools.partial(bot.send_document, tenant.cache_chat_id, disable_notification=True)
+    sources = tenant_documents(tenant)
+    results = await asyncio.gather(
+        *(resolve_document(source, send, resend_cached=False, tenant=tenant)
+          for source in sources),
+        return_exceptions=True)
+    for source, result in zip(sources, results):
+        kind = tenant.scoped(source.kind)
+        if isinstance(result, Exception):
+            logger.error("Prefetching %s failed: %s", kind, result)
+        elif result.via == "deliver":
+            logger.info("Prefetched %s %s", kind, result.identity)
+
+
+async def prefetch_documents(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback: warm every tenant's documents into its cache chat."""
+    await asyncio.gather(*(_prefetch_tenant(context.bot, tenant)
+                           for tenant in all_tenants() if tenant.cache_chat_id is not None))
+
+
+def schedule_prefetch(application: Application) -> None:
+    """Register the startup and cron prefetch jobs on the application's JobQueue."""
+    tenants = [tenant.key for tenant in all_tenants() if tenant.cache_chat_id is not None]
+    if not tenants:
+        logger.info("CACHE_CHAT_ID not set; document prefetch disabled.")
+        return
+    job_queue = application.job_queue
+    if job_queue is None:
+        logger.warning(
+            "JobQueue unavailable; install python-telegram-bot[job-queue] to enable prefetch.")
+        return
+
+    from apscheduler.triggers.cron import CronTrigger
+
+    timezone = os.getenv("PREFETCH_TIMEZONE") or job_queue.scheduler.timezone
+    cron = os.getenv("PREFETCH_CRON", DEFAULT_PREFETCH_CRON)
+    job_queue.run_custom(
+        prefetch_documents,
+        job_kwargs={"trigger": CronTrigger.from_crontab(cron, timezone=timezone)},
+        name="prefetch",
+    )
+    if os.getenv("PREFETCH_ON_STARTUP", "true").lower() not in ("0", "false", "no"):
+        job_queue.run_once(prefetch_documents, when=0, name="prefetch_startup")
+    logger.info("Scheduled document prefetch (%s) for %s", cron, ", ".join(tenants))
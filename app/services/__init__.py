@@ -1,24 +1,101 @@
-from .linktree import fetch_linktree, find_bulletin_link, find_songbook_link
-from .downloads import download_songbook
+from .linktree import (
+    build_link_index,
+    LinkIndex,
+    fetch_linktree,
+    fetch_linktree_async,
+    fetch_linktree_snapshot,
+    find_bulletin_link,
+    find_songbook_link,
+)
+from .downloads import (
+    download_linked_file,
+    download_linked_file_async,
+    download_songbook,
+    download_songbook_async,
+    drive_file_id,
+    DownloadTooLargeError,
+)
 from .drive import (
     fetch_drive_folder,
+    fetch_drive_folder_async,
+    fetch_drive_folder_snapshot,
     extract_outline_file_id,
+    find_outline_doc_file_id,
+    find_outline_pdf_file_id,
+    build_drive_index,
+    DriveEntry,
+    DriveFolderIndex,
     download_outline,
+    download_outline_async,
     extract_pdf_link_from_google,
+    extract_pdf_link_from_google_async,
     clean_google_drive_link,
 )
-from .cache import CacheStore, CACHE
+from .cache import CacheStore, CACHE, open_persistent_cache
+from .cache_backends import CacheBackend, MemoryBackend, SQLiteBackend, create_backend
+from .filestore import FileStore, get_file_store
+from .snapshots import Snapshot, SnapshotCache, LINKTREE_SNAPSHOTS, DRIVE_FOLDER_SNAPSHOTS
+from .http import get_async_client, close_async_client, get_session, close_session
+from .executor import ParsedPages, get_cpu_executor, run_cpu, shutdown_cpu_executor
+from .metrics import MetricsRegistry, REGISTRY, register_health_check, start_metrics_server, track_stage
+from .upstream import CircuitOpenError, GuardedTransport, retry_upstream, upstream_for
 
 __all__ = [
+    "build_link_index",
+    "LinkIndex",
     "fetch_linktree",
+    "fetch_linktree_async",
+    "fetch_linktree_snapshot",
     "find_bulletin_link",
     "find_songbook_link",
+    "download_linked_file",
+    "download_linked_file_async",
     "download_songbook",
+    "download_songbook_async",
+    "drive_file_id",
+    "DownloadTooLargeError",
     "fetch_drive_folder",
+    "fetch_drive_folder_async",
+    "fetch_drive_folder_snapshot",
     "extract_outline_file_id",
+    "find_outline_doc_file_id",
+    "find_outline_pdf_file_id",
+    "build_drive_index",
+    "DriveEntry",
+    "DriveFolderIndex",
     "download_outline",
+    "download_outline_async",
     "extract_pdf_link_from_google",
+    "extract_pdf_link_from_google_async",
     "clean_google_drive_link",
     "CacheStore",
     "CACHE",
+    "open_persistent_cache",
+    "CacheBackend",
+    "MemoryBackend",
+    "SQLiteBackend",
+    "create_backend",
+    "FileStore",
+    "get_file_store",
+    "Snapshot",
+    "SnapshotCache",
+    "LINKTREE_SNAPSHOTS",
+    "DRIVE_FOLDER_SNAPSHOTS",
+    "get_async_client",
+    "close_async_client",
+    "get_session",
+    "close_session",
+    "ParsedPages",
+    "get_cpu_executor",
+    "run_cpu",
+    "shutdown_cpu_executor",
+    "MetricsRegistry",
+    "REGISTRY",
+    "register_health_check",
+    "start_metrics_server",
+    "track_stage",
+    "CircuitOpenError",
+    "GuardedTransport",
+    "retry_upstream",
+    "upstream_for",
 ]
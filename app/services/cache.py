@@ -1,44 +1,397 @@
-from typing import Dict, Optional
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.services.cache_backends import CacheBackend, CacheRow, MemoryBackend, create_backend
+from app.services.metrics import REGISTRY, MetricFamily
+
+LOGGER = logging.getLogger(__name__)
+
+FILE_ID_FOR_NAME = "file_id_for_name"
+FILE_ID_FOR_URL = "file_id_for_url"
+DIRECT_LINK = "direct_link"
+FILE_ID_FOR_DRIVE_ID = "file_id_for_drive_id"
+FILE_ID_FOR_HASH = "file_id_for_hash"
+DOCUMENT_HISTORY = "document_history"
+NAMESPACES = (FILE_ID_FOR_NAME, FILE_ID_FOR_URL, DIRECT_LINK,
+              FILE_ID_FOR_DRIVE_ID, FILE_ID_FOR_HASH, DOCUMENT_HISTORY)
+# Identical bytes are the same document whichever tenant sent them, so
+# content hashes are shared; every other namespace is keyed per tenant.
+SHARED_NAMESPACES = (FILE_ID_FOR_HASH,)
+
+# Tenant prefix for keys read and written by the current task; "" is the
+# default tenant, whose keys are stored unprefixed.
+_SCOPE: contextvars.ContextVar[str] = contextvars.ContextVar("cache_scope", default="")
+
+
+@contextlib.contextmanager
+def cache_scope(scope: str) -> Iterator[None]:
+    """Prefix the cache keys used inside the block (and tasks it starts) with ``scope``."""
+    token = _SCOPE.set(scope)
+    try:
+        yield
+    finally:
+        _SCOPE.reset(token)
+
+
+def _scoped(namespace: str, key: str) -> str:
+    scope = _SCOPE.get()
+    if not scope or namespace in SHARED_NAMESPACES:
+        return key
+    return f"{scope}:{key}"
+
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_FLUSH_BATCH_SIZE = 50
+DEFAULT_MAX_ENTRIES = 1000
+
+
+@dataclass(frozen=True)
+class NamespacePolicy:
+    """Expiry and size limits for one cache namespace; None means no limit."""
+
+    ttl: Optional[float] = None
+    max_entries: Optional[int] = DEFAULT_MAX_ENTRIES
+
+
+# Google's signed viewer links stop working after a few hours, Telegram
+# file_ids do not expire. The document history is the archive itself, so
+# nothing in it is evicted.
+DEFAULT_POLICIES: Dict[str, NamespacePolicy] = {
+    FILE_ID_FOR_NAME: NamespacePolicy(),
+    FILE_ID_FOR_URL: NamespacePolicy(),
+    DIRECT_LINK: NamespacePolicy(ttl=3600),
+    FILE_ID_FOR_DRIVE_ID: NamespacePolicy(),
+    FILE_ID_FOR_HASH: NamespacePolicy(),
+    DOCUMENT_HISTORY: NamespacePolicy(max_entries=None),
+}
+
+
+class _Namespace:
+    """LRU-ordered entries with per-entry write timestamps."""
+
+    def __init__(self, policy: NamespacePolicy) -> None:
+        self.policy = policy
+        self.entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def is_expired(self, stored_at: float, now: float) -> bool:
+        return self.policy.ttl is not None and now - stored_at >= self.policy.ttl
+
+    def get(self, key: str, now: float) -> Tuple[Optional[str], bool]:
+        """Return ``(value, expired)``; expired entries are dropped."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        value, stored_at = entry
+        if self.is_expired(stored_at, now):
+            self.pop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None, True
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value, False
+
+    def put(self, key: str, value: str, stored_at: float) -> List[str]:
+        """Store an entry and return the keys evicted to stay within bounds."""
+        self.pop(key)
+        self.entries[key] = (value, stored_at)
+        self.size_bytes += len(key) + len(value)
+        evicted = []
+        limit = self.policy.max_entries
+        while limit is not None and len(self.entries) > limit:
+            oldest = next(iter(self.entries))
+            self.pop(oldest)
+            self.evictions += 1
+            evicted.append(oldest)
+        return evicted
+
+    def pop(self, key: str) -> bool:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.size_bytes -= len(key) + len(entry[0])
+        return True
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size_bytes = 0
 
 
 class CacheStore:
-    """Simple in-memory cache used by the bot."""
+    """In-memory cache used by the bot, optionally backed by persistent storage.
+
+    Reads are always served from memory. Each namespace is an LRU bounded by
+    its ``NamespacePolicy`` and entries older than the policy TTL are dropped
+    on access. Writes are queued and flushed to the backend in batches, either
+    once ``flush_batch_size`` writes are pending or ``flush_interval`` seconds
+    after the first pending write. Keys are prefixed with the tenant set by
+    ``cache_scope`` for the calling task.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        flush_batch_size: int = DEFAULT_FLUSH_BATCH_SIZE,
+        policies: Optional[Dict[str, NamespacePolicy]] = None,
+    ) -> None:
+        policies = {**DEFAULT_POLICIES, **(policies or {})}
+        self._namespaces: Dict[str, _Namespace] = {
+            namespace: _Namespace(policies[namespace]) for namespace in NAMESPACES}
+        self._backend: CacheBackend = backend or MemoryBackend()
+        self._flush_interval = flush_interval
+        self._flush_batch_size = flush_batch_size
+        self._pending: Dict[Tuple[str, str], CacheRow] = {}
+        self._lock = threading.Lock()
+        # Held from taking the pending rows until they are written, so timer
+        # and batch flushes reach the backend one at a time and in order.
+        self._flush_lock = threading.RLock()
+        self._flush_timer: Optional[threading.Timer] = None
+
+    def open(
+        self,
+        backend: CacheBackend,
+        flush_interval: Optional[float] = None,
+        flush_batch_size: Optional[int] = None,
+    ) -> None:
+        """Attach a persistent backend and warm the cache from it."""
+        if flush_interval is not None:
+            self._flush_interval = flush_interval
+        if flush_batch_size is not None:
+            self._flush_batch_size = flush_batch_size
+        with self._flush_lock:
+            self.flush()
+            self._backend.close()
+            self._backend = backend
+        loaded = 0
+        now = time.time()
+        rows = sorted(backend.load(), key=lambda row: row[3])
+        for namespace, key, value, updated_at in rows:
+            entries = self._namespaces.get(namespace)
+            if entries is None or value is None:
+                continue
+            if entries.is_expired(updated_at, now):
+                self._queue_write((namespace, key, None, now))
+                continue
+            for evicted in entries.put(key, value, updated_at):
+                self._queue_write((namespace, evicted, None, now))
+            loaded += 1
+        LOGGER.info("Loaded %d cache entries from %s",
+                    loaded, type(backend).__name__)
 
-    def __init__(self) -> None:
-        self._file_id_cache: Dict[str, str] = {}
-        self._direct_link_cache: Dict[str, str] = {}
-        self._url_to_file_id_cache: Dict[str, str] = {}
-        self._drive_id_cache: Dict[str, str] = {}
+    def configure(self, policies: Dict[str, NamespacePolicy]) -> None:
+        """Replace namespace policies; existing entries are trimmed lazily."""
+        for namespace, policy in policies.items():
+            self._namespaces[namespace].policy = policy
+
+    def close(self) -> None:
+        """Flush pending writes and release the backend."""
+        with self._flush_lock:
+            self.flush()
+            self._backend.close()
+            self._backend = MemoryBackend()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                rows = list(self._pending.values())
+                self._pending.clear()
+            if not rows:
+                return
+            try:
+                self._backend.write(rows)
+            except Exception as exc:
+                LOGGER.error("Failed to flush %d cache entries: %s", len(rows), exc)
+
+    def _get(self, namespace: str, key: str) -> Optional[str]:
+        key = _scoped(namespace, key)
+        now = time.time()
+        with self._lock:
+            value, expired = self._namespaces[namespace].get(key, now)
+        if expired:
+            self._queue_write((namespace, key, None, now))
+        return value
+
+    def _set(self, namespace: str, key: str, value: str) -> None:
+        key = _scoped(namespace, key)
+        now = time.time()
+        with self._lock:
+            evicted = self._namespaces[namespace].put(key, value, now)
+        self._queue_write((namespace, key, value, now))
+        for evicted_key in evicted:
+            self._queue_write((namespace, evicted_key, None, now))
+
+    def _invalidate(self, namespace: str, key: str, expected: Optional[str] = None) -> None:
+        """Drop an entry, or only if it still holds ``expected`` when given."""
+        key = _scoped(namespace, key)
+        with self._lock:
+            entries = self._namespaces[namespace]
+            current = entries.entries.get(key)
+            if expected is not None and (current is None or current[0] != expected):
+                return
+            removed = entries.pop(key)
+        if removed:
+            LOGGER.info("Invalidated %s entry for %s", namespace, key)
+            self._queue_write((namespace, key, None, time.time()))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return entry counts, approximate sizes and hit/miss counters."""
+        with self._lock:
+            return {
+                name: {
+                    "entries": len(entries.entries),
+                    "size_bytes": entries.size_bytes,
+                    "hits": entries.hits,
+                    "misses": entries.misses,
+                    "evictions": entries.evictions,
+                    "expirations": entries.expirations,
+                }
+                for name, entries in self._namespaces.items()
+            }
+
+    def _queue_write(self, row: CacheRow) -> None:
+        with self._lock:
+            self._pending[(row[0], row[1])] = row
+            flush_now = len(self._pending) >= self._flush_batch_size
+            if not flush_now and self._flush_timer is None:
+                self._flush_timer = threading.Timer(
+                    self._flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if flush_now:
+            self.flush()
 
     def get_file_id_for_name(self, name: str) -> Optional[str]:
-        return self._file_id_cache.get(name)
+        return self._get(FILE_ID_FOR_NAME, name)
 
     def set_file_id_for_name(self, name: str, file_id: str) -> None:
-        self._file_id_cache[name] = file_id
+        self._set(FILE_ID_FOR_NAME, name, file_id)
+
+    def invalidate_file_id_for_name(self, name: str, file_id: Optional[str] = None) -> None:
+        self._invalidate(FILE_ID_FOR_NAME, name, file_id)
 
     def get_file_id_for_url(self, url: str) -> Optional[str]:
-        return self._url_to_file_id_cache.get(url)
+        return self._get(FILE_ID_FOR_URL, url)
 
     def set_file_id_for_url(self, url: str, file_id: str) -> None:
-        self._url_to_file_id_cache[url] = file_id
+        self._set(FILE_ID_FOR_URL, url, file_id)
+
+    def invalidate_file_id_for_url(self, url: str, file_id: Optional[str] = None) -> None:
+        self._invalidate(FILE_ID_FOR_URL, url, file_id)
 
     def get_direct_link(self, url: str) -> Optional[str]:
-        return self._direct_link_cache.get(url)
+        return self._get(DIRECT_LINK, url)
 
     def set_direct_link(self, url: str, direct_link: str) -> None:
-        self._direct_link_cache[url] = direct_link
+        self._set(DIRECT_LINK, url, direct_link)
+
+    def invalidate_direct_link(self, url: str, direct_link: Optional[str] = None) -> None:
+        self._invalidate(DIRECT_LINK, url, direct_link)
 
     def get_file_id_for_drive_id(self, drive_id: str) -> Optional[str]:
-        return self._drive_id_cache.get(drive_id)
+        return self._get(FILE_ID_FOR_DRIVE_ID, drive_id)
 
     def set_file_id_for_drive_id(self, drive_id: str, file_id: str) -> None:
-        self._drive_id_cache[drive_id] = file_id
+        self._set(FILE_ID_FOR_DRIVE_ID, drive_id, file_id)
+
+    def invalidate_file_id_for_drive_id(self, drive_id: str, file_id: Optional[str] = None) -> None:
+        self._invalidate(FILE_ID_FOR_DRIVE_ID, drive_id, file_id)
+
+    def get_file_id_for_hash(self, checksum: str) -> Optional[str]:
+        return self._get(FILE_ID_FOR_HASH, checksum)
+
+    def set_file_id_for_hash(self, checksum: str, file_id: str) -> None:
+        self._set(FILE_ID_FOR_HASH, checksum, file_id)
+
+    def invalidate_file_id_for_hash(self, checksum: str, file_id: Optional[str] = None) -> None:
+        self._invalidate(FILE_ID_FOR_HASH, checksum, file_id)
+
+    def get_history(self, key: str) -> Optional[str]:
+        return self._get(DOCUMENT_HISTORY, key)
+
+    def set_history(self, key: str, record: str) -> None:
+        self._set(DOCUMENT_HISTORY, key, record)
 
     def clear_all(self) -> None:
-        self._file_id_cache.clear()
-        self._direct_link_cache.clear()
-        self._url_to_file_id_cache.clear()
-        self._drive_id_cache.clear()
+        with self._flush_lock:
+            with self._lock:
+                self._pending.clear()
+                for entries in self._namespaces.values():
+                    entries.clear()
+            self._backend.clear()
 
 
 CACHE = CacheStore()
+
+_CACHE_METRICS = (
+    ("hits", "counter", "Cache lookups that found a live entry."),
+    ("misses", "counter", "Cache lookups that found nothing or an expired entry."),
+    ("evictions", "counter", "Entries dropped to stay under max_entries."),
+    ("expirations", "counter", "Entries dropped because their TTL passed."),
+    ("entries", "gauge", "Entries currently held."),
+    ("size_bytes", "gauge", "Approximate size of the keys and values held."),
+)
+
+
+def _cache_metrics(cache: CacheStore = CACHE) -> Iterator[MetricFamily]:
+    stats = cache.stats()
+    for stat, kind, documentation in _CACHE_METRICS:
+        name = f"bulletin_bot_cache_{stat}"
+        if kind == "counter":
+            name += "_total"
+        yield name, kind, documentation, [
+            ({"namespace": namespace}, values[stat]) for namespace, values in stats.items()]
+
+
+REGISTRY.add_collector(_cache_metrics)
+
+
+def policies_from_env() -> Dict[str, NamespacePolicy]:
+    """Read CACHE_TTL_<NAMESPACE> and CACHE_MAX_ENTRIES[_<NAMESPACE>] overrides.
+
+    CACHE_MAX_ENTRIES applies to the bounded namespaces only; an unbounded
+    one (the document history) needs its own override. 0 means no limit.
+    """
+    default_max = int(os.getenv("CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    policies = {}
+    for namespace, default in DEFAULT_POLICIES.items():
+        suffix = namespace.upper()
+        ttl = os.getenv(f"CACHE_TTL_{suffix}")
+        max_entries = os.getenv(f"CACHE_MAX_ENTRIES_{suffix}")
+        if max_entries is not None:
+            limit = int(max_entries) or None
+        else:
+            limit = default_max if default.max_entries is not None else None
+        policies[namespace] = NamespacePolicy(
+            ttl=(float(ttl) or None) if ttl is not None else default.ttl,
+            max_entries=limit,
+        )
+    return policies
+
+
+def open_persistent_cache(cache: CacheStore = CACHE) -> None:
+    """Attach the backend and limits configured via CACHE_* environment variables."""
+    cache.configure(policies_from_env())
+    cache.open(
+        create_backend(),
+        flush_interval=float(
+            os.getenv("CACHE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)),
+        flush_batch_size=int(
+            os.getenv("CACHE_FLUSH_BATCH_SIZE", DEFAULT_FLUSH_BATCH_SIZE)),
+    )
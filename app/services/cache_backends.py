@@ -0,0 +1,105 @@
+"""Persistence backends for CacheStore."""
+import logging
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from app.utils.common import ensure_dir
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join("bulletin_cache", "cache.sqlite3")
+
+# (namespace, key, value, updated_at); a value of None deletes the entry.
+CacheRow = Tuple[str, str, Optional[str], float]
+
+
+class CacheBackend:
+    """Interface for CacheStore persistence; the base class persists nothing."""
+
+    def load(self) -> Iterable[CacheRow]:
+        return []
+
+    def write(self, rows: List[CacheRow]) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Keeps nothing across restarts; the default for scripts."""
+
+
+class SQLiteBackend(CacheBackend):
+    """Stores cache entries in a WAL-mode SQLite file.
+
+    Each batch is written in one transaction, so a crash mid-flush leaves the
+    previous consistent state on disk.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            ensure_dir(directory)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def load(self) -> Iterable[CacheRow]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT namespace, key, value, updated_at FROM cache_entries"
+            ).fetchall()
+
+    def write(self, rows: List[CacheRow]) -> None:
+        upserts = [row for row in rows if row[2] is not None]
+        deletes = [(row[0], row[1]) for row in rows if row[2] is None]
+        with self._lock, self._conn:
+            if upserts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache_entries "
+                    "(namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    upserts,
+                )
+            if deletes:
+                self._conn.executemany(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    deletes,
+                )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache_entries")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_backend(kind: Optional[str] = None, path: Optional[str] = None) -> CacheBackend:
+    """Build the backend selected by CACHE_BACKEND / CACHE_DB_PATH."""
+    kind = (kind or os.getenv("CACHE_BACKEND", "sqlite")).lower()
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or os.getenv("CACHE_DB_PATH", DEFAULT_DB_PATH))
+    raise ValueError(f"Unknown CACHE_BACKEND: {kind}")
@@ -1,46 +1,107 @@
 import logging
 import os
 import re
-from typing import Tuple
+import tempfile
+from typing import TYPE_CHECKING, Optional, Tuple, Union
 
-import requests
+import httpx
 
-from app.utils.common import ensure_dir
+from app.services.filestore import get_file_store
+from app.services.http import get_async_client, get_session
+from app.services.metrics import track_stage
+from app.utils.common import ensure_dir, new_checksum
+
+if TYPE_CHECKING:
+    import requests
 
 LOGGER = logging.getLogger(__name__)
-USER_AGENT = (
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/91.0.4472.114 Safari/537.36"
-)
 
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_DOWNLOAD_BYTES = 100 * 1024 * 1024
 
-def _headers():
-    return {"User-Agent": USER_AGENT}
 
+class DownloadTooLargeError(ValueError):
+    """Raised when a download exceeds DOWNLOAD_MAX_BYTES."""
 
-def _derive_download_url(view_url: str) -> str:
-    match = re.search(r"/file/d/([a-zA-Z0-9_-]+)", view_url)
-    if not match:
-        return view_url
-    file_id = match.group(1)
-    return f"https://drive.google.com/uc?export=download&id={file_id}"
 
+def _max_download_bytes() -> int:
+    return int(os.getenv("DOWNLOAD_MAX_BYTES", DEFAULT_MAX_DOWNLOAD_BYTES))
+
+
+class ChunkedDownload:
+    """Stream chunks into a temp file in ``cache_dir``, hashing as they arrive.
+
+    The file only enters the file store once ``commit`` moves it there, so
+    readers never see a partial download. Used as a context manager the temp
+    file is removed if anything fails before the commit.
+    """
+
+    def __init__(self, cache_dir: str, expected_size: Optional[int] = None,
+                 max_bytes: Optional[int] = None) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes if max_bytes is not None else _max_download_bytes()
+        if expected_size is not None and expected_size > self.max_bytes:
+            raise DownloadTooLargeError(
+                f"Download of {expected_size} bytes exceeds limit of {self.max_bytes}")
+        ensure_dir(cache_dir)
+        fd, self.temp_path = tempfile.mkstemp(
+            dir=cache_dir, prefix=".download-", suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._hasher = new_checksum()
+        self.size = 0
+
+    def __enter__(self) -> "ChunkedDownload":
+        return self
 
-def _persist_file(content: bytes, cache_dir: str, filename: str) -> str:
-    ensure_dir(cache_dir)
-    filepath = os.path.join(cache_dir, filename)
-    if os.path.exists(filepath):
-        LOGGER.info("File already cached: %s", filepath)
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.discard()
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise DownloadTooLargeError(
+                f"Download exceeded limit of {self.max_bytes} bytes")
+        self._hasher.update(chunk)
+        self._file.write(chunk)
+
+    @property
+    def checksum(self) -> str:
+        return self._hasher.hexdigest()
+
+    def commit(self, filename: str) -> str:
+        """Hand the finished download to the content-addressed file store."""
+        self._file.close()
+        filepath = get_file_store(self.cache_dir).put(
+            self.temp_path, filename, self.checksum)
+        LOGGER.info("Cached %s at %s (%d bytes)", filename, filepath, self.size)
         return filepath
 
-    with open(filepath, "wb") as destination:
-        destination.write(content)
-    LOGGER.info("Cached file at %s", filepath)
-    return filepath
+    def discard(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def content_length(response: Union["requests.Response", httpx.Response]) -> Optional[int]:
+    value = response.headers.get("content-length")
+    return int(value) if value and value.isdigit() else None
 
 
-def _resolve_filename(response: requests.Response, fallback: str) -> str:
+def drive_file_id(url: str) -> Optional[str]:
+    """Return the Drive file id in a ``/file/d/<id>`` link, if there is one."""
+    match = re.search(r"/file/d/([a-zA-Z0-9_-]+)", url)
+    return match.group(1) if match else None
+
+
+def _derive_download_url(view_url: str) -> str:
+    file_id = drive_file_id(view_url)
+    if not file_id:
+        return view_url
+    return f"https://drive.google.com/uc?export=download&id={file_id}"
+
+
+def _resolve_filename(response: Union["requests.Response", httpx.Response], fallback: str) -> str:
     header = response.headers.get("content-disposition")
     if header:
         match = re.findall(r'filename="?([^"]+)"?', header)
@@ -49,17 +110,46 @@ def _resolve_filename(response: requests.Response, fallback: str) -> str:
     return fallback
 
 
-def download_songbook(url: str, cache_dir: str = "bulletin_cache") -> Tuple[str, str]:
-    """Download the songbook PDF and return (filepath, filename)."""
+def download_linked_file(url: str, fallback_name: str,
+                         cache_dir: str = "bulletin_cache") -> Tuple[str, str]:
+    """Download the file behind a Drive share link and return (filepath, filename)."""
     download_url = _derive_download_url(url)
-    LOGGER.info("Downloading songbook from %s", download_url)
+    LOGGER.info("Downloading %s from %s", fallback_name, download_url)
 
-    response = requests.get(download_url, headers=_headers(),
-                            allow_redirects=True, timeout=60)
-    response.raise_for_status()
-    content = response.content
+    with get_session().get(download_url, allow_redirects=True, timeout=60, stream=True) as response:
+        response.raise_for_status()
+        with ChunkedDownload(cache_dir, content_length(response)) as download:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                download.write(chunk)
 
-    fallback_name = f"songbook.pdf"
-    filename = _resolve_filename(response, fallback_name)
-    filepath = _persist_file(content, cache_dir, filename)
+            filename = _resolve_filename(response, fallback_name)
+            filepath = download.commit(filename)
     return filepath, filename
+
+
+async def download_linked_file_async(url: str, fallback_name: str,
+                                     cache_dir: str = "bulletin_cache") -> Tuple[str, str]:
+    """Async variant of download_linked_file using the shared client."""
+    download_url = _derive_download_url(url)
+    LOGGER.info("Downloading %s from %s", fallback_name, download_url)
+
+    with track_stage("download"):
+        async with get_async_client().stream("GET", download_url, timeout=60) as response:
+            response.raise_for_status()
+            with ChunkedDownload(cache_dir, content_length(response)) as download:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    download.write(chunk)
+
+                filename = _resolve_filename(response, fallback_name)
+                filepath = download.commit(filename)
+    return filepath, filename
+
+
+def download_songbook(url: str, cache_dir: str = "bulletin_cache") -> Tuple[str, str]:
+    """Download the songbook PDF and return (filepath, filename)."""
+    return download_linked_file(url, "songbook.pdf", cache_dir)
+
+
+async def download_songbook_async(url: str, cache_dir: str = "bulletin_cache") -> Tuple[str, str]:
+    """Async variant of download_songbook using the shared client."""
+    return await download_linked_file_async(url, "songbook.pdf", cache_dir)
@@ -3,22 +3,21 @@ import json
 import logging
 import os
 import re
-from typing import Optional, Tuple
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 
-import requests
+import httpx
 
-from app.utils.common import ensure_dir, get_file_checksum
-
-LOGGER = logging.getLogger(__name__)
-USER_AGENT = (
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/91.0.4472.114 Safari/537.36"
-)
+from app.services.downloads import CHUNK_SIZE, ChunkedDownload, content_length
+from app.services.executor import ParsedPages
+from app.services.http import get_async_client, get_session
+from app.services.metrics import track_stage
+from app.services.snapshots import DRIVE_FOLDER_SNAPSHOTS, Snapshot
 
+if TYPE_CHECKING:
+    import requests
 
-def _headers():
-    return {"User-Agent": USER_AGENT}
+LOGGER = logging.getLogger(__name__)
 
 
 def clean_google_drive_link(raw_url: str) -> str:
@@ -32,26 +31,47 @@ def clean_google_drive_link(raw_url: str) -> str:
     return cleaned.strip('"').strip("'")
 
 
-def _extract_viewer_url(drive_url: str) -> Optional[str]:
-    response = requests.get(drive_url, headers=_headers(), timeout=60)
-    response.raise_for_status()
+def _find_viewer_url(html: str) -> Optional[str]:
     match = re.search(
-        r"(https://drive\.google\.com/viewerng/upload[^\"]+)", response.text)
+        r"(https://drive\.google\.com/viewerng/upload[^\"]+)", html)
     if not match:
         LOGGER.warning("Could not find viewerng URL in Drive HTML")
         return None
     return match.group(1)
 
 
-def _extract_pdf_link_from_viewer(viewer_url: str) -> Optional[str]:
-    response = requests.get(viewer_url, headers=_headers(), timeout=60)
-    response.raise_for_status()
-    content = response.text
+def _strip_xssi_prefix(content: str) -> str:
     if content.startswith(")]}'"):
         content = content[4:].strip()
     return content
 
 
+def _extract_viewer_url(drive_url: str) -> Optional[str]:
+    response = get_session().get(drive_url, timeout=60)
+    response.raise_for_status()
+    return _find_viewer_url(response.text)
+
+
+def _extract_pdf_link_from_viewer(viewer_url: str) -> Optional[str]:
+    response = get_session().get(viewer_url, timeout=60)
+    response.raise_for_status()
+    return _strip_xssi_prefix(response.text)
+
+
+async def _extract_viewer_url_async(drive_url: str) -> Optional[str]:
+    with track_stage("drive_viewer"):
+        response = await get_async_client().get(drive_url, timeout=60)
+        response.raise_for_status()
+    return _find_viewer_url(response.text)
+
+
+async def _extract_pdf_link_from_viewer_async(viewer_url: str) -> Optional[str]:
+    with track_stage("drive_pdf_link"):
+        response = await get_async_client().get(viewer_url, timeout=60)
+        response.raise_for_status()
+    return _strip_xssi_prefix(response.text)
+
+
 def extract_pdf_link_from_google(drive_url: str) -> Optional[str]:
     try:
         viewer_url = _extract_viewer_url(drive_url)
@@ -69,24 +89,149 @@ def extract_pdf_link_from_google(drive_url: str) -> Optional[str]:
         return None
 
 
-def fetch_drive_folder(url: Optional[str] = None) -> str:
+async def extract_pdf_link_from_google_async(drive_url: str) -> Optional[str]:
+    """Async variant of extract_pdf_link_from_google."""
+    try:
+        viewer_url = await _extract_viewer_url_async(drive_url)
+        if not viewer_url:
+            return None
+        cleaned_url = clean_google_drive_link(viewer_url)
+        content = await _extract_pdf_link_from_viewer_async(cleaned_url)
+        if not content:
+            return None
+
+        data = json.loads(content)
+        return data.get("pdf")
+    except Exception as exc:
+        LOGGER.error("Error extracting direct PDF link: %s", exc)
+        return None
+
+
+def _resolve_folder_url(url: Optional[str]) -> str:
     if url is None:
         url = os.getenv("OUTLINE_FOLDER_URL")
         if not url:
             raise ValueError(
                 "OUTLINE_FOLDER_URL environment variable is not set")
+    return url
+
+
+def fetch_drive_folder(url: Optional[str] = None) -> str:
+    url = _resolve_folder_url(url)
+
+    response = get_session().get(url, timeout=60)
+    response.raise_for_status()
+    return response.text
+
 
-    response = requests.get(url, headers=_headers(), timeout=60)
+async def fetch_drive_folder_async(url: Optional[str] = None) -> str:
+    """Async variant of fetch_drive_folder."""
+    url = _resolve_folder_url(url)
+
+    response = await get_async_client().get(url, timeout=60)
     response.raise_for_status()
     return response.text
 
 
-def extract_outline_file_id(html_content: str, mime_type_fragment: str) -> Optional[str]:
-    """Parse the Drive folder HTML and return the first file id matching a mime fragment."""
+async def fetch_drive_folder_snapshot(url: Optional[str] = None, revalidate: bool = False) -> Snapshot:
+    """Return the cached Drive folder snapshot, revalidating it once its TTL lapses.
+
+    The listing is decoded on the CPU pool; see ``build_drive_index``.
+    """
+    snapshot = await DRIVE_FOLDER_SNAPSHOTS.get(_resolve_folder_url(url), revalidate=revalidate)
+    await build_drive_index.ensure(snapshot.text)
+    return snapshot
+
+
+# Positions inside each _DRIVE_ivd item. The listing is undocumented, so the
+# optional fields are read defensively and ignored when absent.
+_ITEM_ID = 0
+_ITEM_NAME = 2
+_ITEM_MIME_TYPE = 3
+_ITEM_MODIFIED_MS = 10
+_ITEM_SIZE = 13
+
+
+@dataclass(frozen=True)
+class DriveEntry:
+    """One file listed in a public Drive folder page."""
+
+    id: str
+    name: str
+    mime_type: str
+    modified_ms: Optional[int] = None
+    size: Optional[int] = None
+
+
+def _optional_int(item: list, index: int) -> Optional[int]:
+    if len(item) <= index:
+        return None
+    value = item[index]
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def _parse_drive_entry(item) -> Optional[DriveEntry]:
+    if not isinstance(item, list) or len(item) <= _ITEM_MIME_TYPE:
+        return None
+    file_id, mime_type = item[_ITEM_ID], item[_ITEM_MIME_TYPE]
+    if not isinstance(file_id, str) or not isinstance(mime_type, str):
+        return None
+    name = item[_ITEM_NAME] if isinstance(item[_ITEM_NAME], str) else ""
+    return DriveEntry(
+        id=file_id,
+        name=name,
+        mime_type=mime_type,
+        modified_ms=_optional_int(item, _ITEM_MODIFIED_MS),
+        size=_optional_int(item, _ITEM_SIZE),
+    )
+
+
+class DriveFolderIndex:
+    """Entries of one Drive folder page keyed by id, name and mime type.
+
+    Lookups by mime type fragment (e.g. ``"wordprocessingml"``) are memoised,
+    so after the first call both ``first`` and ``latest`` are dictionary hits.
+    """
+
+    def __init__(self, entries: List[DriveEntry]) -> None:
+        self.entries = entries
+        self.by_id: Dict[str, DriveEntry] = {entry.id: entry for entry in entries}
+        self.by_name: Dict[str, DriveEntry] = {}
+        self.by_mime_type: Dict[str, List[DriveEntry]] = {}
+        for entry in entries:
+            self.by_name.setdefault(entry.name, entry)
+            self.by_mime_type.setdefault(entry.mime_type, []).append(entry)
+        self._fragments: Dict[str, Tuple[Optional[DriveEntry], Optional[DriveEntry]]] = {}
+
+    def _lookup(self, mime_type_fragment: str) -> Tuple[Optional[DriveEntry], Optional[DriveEntry]]:
+        if mime_type_fragment not in self._fragments:
+            matches = [entry for entry in self.entries
+                       if mime_type_fragment in entry.mime_type]
+            first = matches[0] if matches else None
+            # max() keeps the earliest entry on ties, so undated listings
+            # fall back to document order.
+            latest = max(matches, key=lambda entry: entry.modified_ms or -1) if matches else None
+            self._fragments[mime_type_fragment] = (first, latest)
+        return self._fragments[mime_type_fragment]
+
+    def first(self, mime_type_fragment: str) -> Optional[DriveEntry]:
+        return self._lookup(mime_type_fragment)[0]
+
+    def latest(self, mime_type_fragment: str) -> Optional[DriveEntry]:
+        return self._lookup(mime_type_fragment)[1]
+
+
+def _parse_drive_index(html_content: str) -> DriveFolderIndex:
     match = re.search(r"window\['_DRIVE_ivd'\] = '([^']+)'", html_content)
     if not match:
         LOGGER.error("Could not find _DRIVE_ivd in HTML")
-        return None
+        return DriveFolderIndex([])
 
     encoded_json = match.group(1)
     try:
@@ -94,18 +239,42 @@ def extract_outline_file_id(html_content: str, mime_type_fragment: str) -> Optio
         data = json.loads(decoded_json)
     except Exception as exc:
         LOGGER.error("Error decoding Drive JSON: %s", exc)
-        return None
+        return DriveFolderIndex([])
 
     if not data or not isinstance(data, list) or not data[0]:
-        return None
+        return DriveFolderIndex([])
 
-    for item in data[0]:
-        if len(item) > 3 and mime_type_fragment in item[3]:
-            return item[0]
-    return None
+    entries = [entry for entry in map(_parse_drive_entry, data[0]) if entry is not None]
+    return DriveFolderIndex(entries)
+
+
+# Parse a Drive folder page once; repeated calls for the same HTML are free.
+# Sized for one current page per tenant.
+build_drive_index = ParsedPages(_parse_drive_index, "parse_drive_folder", maxsize=64)
+
+
+def extract_outline_file_id(html_content: str, mime_type_fragment: str, latest: bool = False) -> Optional[str]:
+    """Return the first (or most recently modified) file id matching a mime fragment."""
+    index = build_drive_index(html_content)
+    entry = index.latest(mime_type_fragment) if latest else index.first(mime_type_fragment)
+    return entry.id if entry else None
+
+
+def find_outline_pdf_file_id(html_content: str) -> Optional[str]:
+    """Return the most recently modified PDF outline's file id."""
+    return extract_outline_file_id(html_content, "application/pdf", latest=True)
 
 
-def _resolve_drive_filename(response: requests.Response, filename_prefix: str, content: bytes) -> str:
+def find_outline_doc_file_id(html_content: str) -> Optional[str]:
+    """Return the most recently modified Word outline's file id, .docx or legacy .doc."""
+    file_id = extract_outline_file_id(html_content, "wordprocessingml", latest=True)
+    if not file_id:
+        # Try msword just in case
+        file_id = extract_outline_file_id(html_content, "msword", latest=True)
+    return file_id
+
+
+def _resolve_drive_filename(response: Union["requests.Response", httpx.Response], filename_prefix: str, checksum: str) -> str:
     """Resolve filename from content-disposition or build checksum-based fallback."""
     header = response.headers.get("content-disposition")
     if header:
@@ -113,22 +282,42 @@ def _resolve_drive_filename(response: requests.Response, filename_prefix: str, c
         if match:
             return match[0]
 
-    checksum = get_file_checksum(content)
     return f"{filename_prefix}_{checksum}"
 
 
+def _outline_download_url(file_id: str) -> str:
+    return f"https://drive.google.com/uc?export=download&id={file_id}"
+
+
 def download_outline(file_id: str, filename_prefix: str = "outline", cache_dir: str = "bulletin_cache") -> Tuple[str, str]:
-    ensure_dir(cache_dir)
-    download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
+    download_url = _outline_download_url(file_id)
 
-    response = requests.get(download_url, allow_redirects=True, timeout=60)
-    response.raise_for_status()
-    content = response.content
+    with get_session().get(download_url, allow_redirects=True, timeout=60, stream=True) as response:
+        response.raise_for_status()
+        with ChunkedDownload(cache_dir, content_length(response)) as download:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                download.write(chunk)
+
+            filename = _resolve_drive_filename(
+                response, filename_prefix, download.checksum)
+            filepath = download.commit(filename)
+
+    return filepath, filename
+
+
+async def download_outline_async(file_id: str, filename_prefix: str = "outline", cache_dir: str = "bulletin_cache") -> Tuple[str, str]:
+    """Async variant of download_outline."""
+    download_url = _outline_download_url(file_id)
 
-    filename = _resolve_drive_filename(response, filename_prefix, content)
+    with track_stage("download"):
+        async with get_async_client().stream("GET", download_url, timeout=60) as response:
+            response.raise_for_status()
+            with ChunkedDownload(cache_dir, content_length(response)) as download:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    download.write(chunk)
 
-    filepath = os.path.join(cache_dir, filename)
-    with open(filepath, "wb") as destination:
-        destination.write(content)
+                filename = _resolve_drive_filename(
+                    response, filename_prefix, download.checksum)
+                filepath = download.commit(filename)
 
     return filepath, filename
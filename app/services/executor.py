@@ -0,0 +1,156 @@
+"""Run CPU-bound work (page parsing, JSON decoding) off the event loop.
+
+``CPU_EXECUTOR`` picks the pool: ``thread`` (default), ``process`` or
+``inline`` to run on the loop as before. ``CPU_WORKERS`` sizes it. Process
+pools sidestep the GIL but every argument and result is pickled, so only
+module-level functions returning plain data go through ``run_cpu``.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from app.services.metrics import EVENT_LOOP_LAG_SECONDS, track_stage
+from app.services.singleflight import SingleFlight
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_CPU_EXECUTOR = "thread"
+DEFAULT_CPU_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+_EXECUTOR: Optional[concurrent.futures.Executor] = None
+_EXECUTOR_KIND: Optional[str] = None
+_LAG_MONITOR: Optional["asyncio.Task[None]"] = None
+
+
+def _create_executor() -> Optional[concurrent.futures.Executor]:
+    global _EXECUTOR_KIND
+    kind = os.getenv("CPU_EXECUTOR", DEFAULT_CPU_EXECUTOR).lower()
+    workers = int(os.getenv("CPU_WORKERS", DEFAULT_CPU_WORKERS))
+    _EXECUTOR_KIND = kind
+    if kind == "inline" or workers < 1:
+        return None
+    if kind == "process":
+        # spawn: forking a process that already runs threads is unsafe.
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    if kind != "thread":
+        LOGGER.warning("Unknown CPU_EXECUTOR %r, using a thread pool", kind)
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="cpu")
+
+
+def get_cpu_executor() -> Optional[concurrent.futures.Executor]:
+    """Return the shared CPU pool, or None when CPU_EXECUTOR=inline."""
+    global _EXECUTOR
+    if _EXECUTOR_KIND is None:
+        _EXECUTOR = _create_executor()
+    return _EXECUTOR
+
+
+def shutdown_cpu_executor() -> None:
+    global _EXECUTOR, _EXECUTOR_KIND
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    _EXECUTOR = None
+    _EXECUTOR_KIND = None
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any) -> T:
+    """Await ``fn(*args)`` on the CPU pool."""
+    executor = get_cpu_executor()
+    if executor is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(fn, *args))
+
+
+class ParsedPages(Generic[T]):
+    """LRU of pages parsed by ``parse``, keyed by the page text.
+
+    Calling it parses on the current thread, like ``functools.lru_cache``.
+    ``ensure`` parses on the CPU pool instead and is what the async fetch
+    paths use, so the synchronous lookups that follow are cache hits.
+    ``parse`` must be a module-level function under its own name so a
+    process pool can pickle it.
+    """
+
+    def __init__(self, parse: Callable[[str], T], stage: str, maxsize: int) -> None:
+        self._parse = parse
+        self._stage = stage
+        self._maxsize = maxsize
+        self._pages: "collections.OrderedDict[str, T]" = collections.OrderedDict()
+        self._flight = SingleFlight()
+        # The synchronous helpers may still be called from worker threads.
+        self._lock = threading.Lock()
+
+    def _get(self, text: str) -> Optional[T]:
+        with self._lock:
+            parsed = self._pages.get(text)
+            if parsed is not None:
+                self._pages.move_to_end(text)
+            return parsed
+
+    def _put(self, text: str, parsed: T) -> T:
+        with self._lock:
+            self._pages[text] = parsed
+            self._pages.move_to_end(text)
+            while len(self._pages) > self._maxsize:
+                self._pages.popitem(last=False)
+        return parsed
+
+    def __call__(self, text: str) -> T:
+        parsed = self._get(text)
+        if parsed is None:
+            with track_stage(self._stage, upstream=False):
+                parsed = self._put(text, self._parse(text))
+        return parsed
+
+    async def ensure(self, text: str) -> T:
+        parsed = self._get(text)
+        if parsed is not None:
+            return parsed
+
+        async def parse() -> T:
+            with track_stage(self._stage, upstream=False):
+                return self._put(text, await run_cpu(self._parse, text))
+
+        parsed, _ = await self._flight.do(text, parse)
+        return parsed
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+
+
+async def monitor_event_loop_lag(interval: Optional[float] = None) -> None:
+    """Record how late the loop wakes from ``interval``-second sleeps, forever."""
+    if interval is None:
+        interval = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", DEFAULT_LOOP_LAG_INTERVAL_SECONDS))
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - interval))
+
+
+def start_event_loop_lag_monitor() -> None:
+    """Start ``monitor_event_loop_lag`` on the running loop unless it already runs."""
+    global _LAG_MONITOR
+    if _LAG_MONITOR is None or _LAG_MONITOR.done():
+        _LAG_MONITOR = asyncio.create_task(monitor_event_loop_lag(), name="event_loop_lag")
+
+
+def stop_event_loop_lag_monitor() -> None:
+    global _LAG_MONITOR
+    if _LAG_MONITOR is not None:
+        _LAG_MONITOR.cancel()
+    _LAG_MONITOR = None
@@ -0,0 +1,141 @@
+"""Content-addressed storage for downloaded documents."""
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.common import ensure_dir
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_ROOT = "bulletin_cache"
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+INDEX_FILENAME = "index.json"
+
+
+class FileStore:
+    """Store files once per content hash under ``<root>/objects``.
+
+    A ``filename -> checksum`` index records which blob each download name
+    currently points at, so a renamed or re-downloaded document with the same
+    bytes reuses the existing blob. Once the blobs exceed ``max_bytes`` the
+    least recently used ones are deleted along with their index entries.
+    """
+
+    def __init__(self, root: str = DEFAULT_ROOT, max_bytes: Optional[int] = None) -> None:
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Dict[str, str] = self._load_index()
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return int(os.getenv("FILE_STORE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+    def _load_index(self) -> Dict[str, str]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            LOGGER.error("Ignoring unreadable file store index: %s", exc)
+            return {}
+
+    def _save_index(self) -> None:
+        ensure_dir(self.root)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".index-")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(self._index, handle)
+        os.replace(temp_path, self.index_path)
+
+    def blob_path(self, checksum: str) -> str:
+        return os.path.join(self.objects_dir, checksum[:2], checksum)
+
+    def put(self, temp_path: str, filename: str, checksum: str) -> str:
+        """Move a finished download into the store and return its blob path.
+
+        If a blob with the same checksum already exists the temp file is
+        dropped instead, so identical bytes are only kept once.
+        """
+        path = self.blob_path(checksum)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(temp_path)
+                os.utime(path)
+                LOGGER.info("Reusing stored content %s for %s", checksum, filename)
+            else:
+                ensure_dir(os.path.dirname(path))
+                os.replace(temp_path, path)
+                LOGGER.info("Stored %s as %s", filename, checksum)
+            if self._index.get(filename) != checksum:
+                self._index[filename] = checksum
+                self._save_index()
+            self._evict(keep=checksum)
+        return path
+
+    def checksum_for(self, filename: str) -> Optional[str]:
+        with self._lock:
+            return self._index.get(filename)
+
+    def path_for(self, filename: str) -> Optional[str]:
+        """Return the blob currently stored for a filename, if still present."""
+        checksum = self.checksum_for(filename)
+        if checksum is None:
+            return None
+        path = self.blob_path(checksum)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        return path
+
+    def _blobs(self) -> List[Tuple[float, int, str]]:
+        if not os.path.isdir(self.objects_dir):
+            return []
+        blobs = []
+        for prefix in os.listdir(self.objects_dir):
+            directory = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(directory):
+                stat = os.stat(os.path.join(directory, name))
+                blobs.append((stat.st_mtime, stat.st_size, name))
+        return blobs
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        blobs = self._blobs()
+        total = sum(size for _, size, _ in blobs)
+        if total <= self.max_bytes:
+            return
+
+        evicted = set()
+        for _, size, checksum in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            if checksum == keep:
+                continue
+            os.remove(self.blob_path(checksum))
+            total -= size
+            evicted.add(checksum)
+            LOGGER.info("Evicted stored content %s (%d bytes)", checksum, size)
+
+        self._index = {
+            name: checksum for name, checksum in self._index.items()
+            if checksum not in evicted
+        }
+        self._save_index()
+
+
+_STORES: Dict[str, FileStore] = {}
+
+
+def get_file_store(root: str = DEFAULT_ROOT) -> FileStore:
+    """Return the shared store for a cache directory."""
+    store = _STORES.get(root)
+    if store is None:
+        store = _STORES[root] = FileStore(root)
+    return store
@@ -0,0 +1,135 @@
+"""Shared, connection-pooled HTTP transports used by the service layer."""
+import importlib.util
+import logging
+import os
+from typing import TYPE_CHECKING, Dict, Optional
+
+import httpx
+
+from app.services.upstream import GuardedTransport, host_settings
+
+if TYPE_CHECKING:
+    import requests
+
+LOGGER = logging.getLogger(__name__)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/91.0.4472.114 Safari/537.36"
+)
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 120.0
+DEFAULT_HOST_POOL_SIZES = {
+    "linktr.ee": 4,
+    "drive.google.com": 16,
+    "drive.usercontent.google.com": 8,
+}
+
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+_SESSION: Optional["requests.Session"] = None
+
+
+def default_headers() -> Dict[str, str]:
+    """Return the headers sent with every upstream request."""
+    return {"User-Agent": USER_AGENT}
+
+
+def _host_pool_sizes() -> Dict[str, int]:
+    """Parse HTTP_HOST_POOL_SIZES ("host=size,host=size") over the defaults."""
+    return host_settings("HTTP_HOST_POOL_SIZES", DEFAULT_HOST_POOL_SIZES, int)
+
+
+def _max_connections() -> int:
+    return int(os.getenv("HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
+
+
+def _keepalive_expiry() -> float:
+    return float(os.getenv("HTTP_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY))
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("HTTP2_ENABLED", "true").lower() in ("0", "false", "no"):
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+def _async_transport(pool_size: int, http2: bool) -> httpx.AsyncBaseTransport:
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=_keepalive_expiry(),
+    )
+    return GuardedTransport(httpx.AsyncHTTPTransport(limits=limits, http2=http2))
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the process-wide async client, creating it on first use.
+
+    Each configured host gets its own keep-alive pool so a burst of Drive
+    downloads cannot starve the Linktree connections, and vice versa. Every
+    transport is wrapped in GuardedTransport for the per-host limits.
+    """
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT.is_closed:
+        http2 = _http2_enabled()
+        mounts = {
+            f"https://{host}": _async_transport(size, http2)
+            for host, size in _host_pool_sizes().items()
+        }
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            headers=default_headers(),
+            follow_redirects=True,
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT),
+            transport=_async_transport(_max_connections(), http2),
+            mounts=mounts,
+        )
+        LOGGER.info("Opened shared async HTTP client (http2=%s)", http2)
+    return _ASYNC_CLIENT
+
+
+def install_async_client(client: httpx.AsyncClient) -> None:
+    """Use ``client`` as the shared async client, e.g. one routed to a local stand-in server."""
+    global _ASYNC_CLIENT
+    _ASYNC_CLIENT = client
+
+
+async def close_async_client() -> None:
+    """Close the shared async client if it was opened."""
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is not None and not _ASYNC_CLIENT.is_closed:
+        await _ASYNC_CLIENT.aclose()
+        LOGGER.info("Closed shared async HTTP client")
+    _ASYNC_CLIENT = None
+
+
+def get_session() -> "requests.Session":
+    """Return the process-wide requests session used by the sync helpers.
+
+    requests is imported here rather than at module level: the bot itself
+    only uses the async client, so it never pays for the import.
+    """
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.headers.update(default_headers())
+        default_adapter = HTTPAdapter(pool_maxsize=_max_connections())
+        session.mount("https://", default_adapter)
+        session.mount("http://", default_adapter)
+        for host, size in _host_pool_sizes().items():
+            session.mount(f"https://{host}/", HTTPAdapter(pool_maxsize=size))
+        _SESSION = session
+    return _SESSION
+
+
+def close_session() -> None:
+    """Close the shared requests session if it was opened."""
+    global _SESSION
+    if _SESSION is not None:
+        _SESSION.close()
+    _SESSION = None
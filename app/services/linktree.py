@@ -1,44 +1,167 @@
+import json
 import logging
 import os
-from typing import Optional
+import re
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional, Tuple
 
-import requests
-from bs4 import BeautifulSoup
-from tenacity import retry, stop_after_attempt, wait_fixed
+from app.services.executor import ParsedPages
+from app.services.http import get_async_client, get_session
+from app.services.snapshots import LINKTREE_SNAPSHOTS, Snapshot
+from app.services.upstream import retry_upstream
 
 LOGGER = logging.getLogger(__name__)
-USER_AGENT = (
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/91.0.4472.114 Safari/537.36"
-)
 
 
-def _get_headers():
-    return {"User-Agent": USER_AGENT}
-
-
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-def fetch_linktree(url: Optional[str] = None) -> str:
-    """Fetch and return the Linktree HTML."""
+def _resolve_linktree_url(url: Optional[str]) -> str:
     if url is None:
         url = os.getenv("LINKTREE_URL")
         if not url:
             raise ValueError("LINKTREE_URL environment variable is not set")
+    return url
+
+
+@retry_upstream
+def fetch_linktree(url: Optional[str] = None) -> str:
+    """Fetch and return the Linktree HTML."""
+    url = _resolve_linktree_url(url)
+
+    response = get_session().get(url, timeout=30)
+    response.raise_for_status()
+    return response.text
+
+
+@retry_upstream
+async def fetch_linktree_async(url: Optional[str] = None) -> str:
+    """Fetch and return the Linktree HTML without blocking the event loop."""
+    url = _resolve_linktree_url(url)
 
-    response = requests.get(url, headers=_get_headers(), timeout=30)
+    response = await get_async_client().get(url, timeout=30)
     response.raise_for_status()
     return response.text
 
 
+async def fetch_linktree_snapshot(url: Optional[str] = None, revalidate: bool = False) -> Snapshot:
+    """Return the cached Linktree snapshot, revalidating it once its TTL lapses.
+
+    The page is parsed on the CPU pool, so looking links up in it afterwards
+    doesn't block the event loop.
+    """
+    snapshot = await LINKTREE_SNAPSHOTS.get(_resolve_linktree_url(url), revalidate=revalidate)
+    await build_link_index.ensure(snapshot.text)
+    return snapshot
+
+
+class _AnchorCollector(HTMLParser):
+    """Single streaming pass that records (text, href) for every <a> tag."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.anchors: List[Tuple[str, Optional[str]]] = []
+        self._href: Optional[str] = None
+        self._text: List[str] = []
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        if self._depth == 0:
+            self._href = dict(attrs).get("href")
+            self._text = []
+        self._depth += 1
+
+    def handle_endtag(self, tag):
+        if tag != "a" or self._depth == 0:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            self.anchors.append(("".join(self._text), self._href))
+
+    def handle_data(self, data):
+        if self._depth:
+            self._text.append(data)
+
+    def close(self) -> None:
+        super().close()
+        if self._depth:
+            self.anchors.append(("".join(self._text), self._href))
+            self._depth = 0
+
+
+_NEXT_DATA_RE = re.compile(
+    r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+
+
+def _iter_next_data_links(node) -> Iterator[Tuple[str, str]]:
+    if isinstance(node, dict):
+        title, url = node.get("title"), node.get("url")
+        if isinstance(title, str) and isinstance(url, str):
+            yield title, url
+        for value in node.values():
+            yield from _iter_next_data_links(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _iter_next_data_links(value)
+
+
+def _next_data_links(html_content: str) -> List[Tuple[str, str]]:
+    match = _NEXT_DATA_RE.search(html_content)
+    if not match:
+        return []
+    try:
+        return list(_iter_next_data_links(json.loads(match.group(1))))
+    except ValueError as exc:
+        LOGGER.warning("Could not decode Linktree __NEXT_DATA__: %s", exc)
+        return []
+
+
+class LinkIndex:
+    """Anchor text/href pairs from one Linktree page, with memoised lookups.
+
+    Anchors are matched first, in document order, so results match the old
+    BeautifulSoup scan. Links embedded in the page's ``__NEXT_DATA__`` JSON
+    are only consulted when no anchor matches, which covers client-rendered
+    pages.
+    """
+
+    def __init__(self, anchors: List[Tuple[str, Optional[str]]],
+                 next_data: List[Tuple[str, str]]) -> None:
+        self.anchors = anchors
+        self.next_data = next_data
+        self._lookups: Dict[str, Optional[str]] = {}
+
+    def find(self, keyword: str) -> Optional[str]:
+        if keyword not in self._lookups:
+            self._lookups[keyword] = self._scan(keyword)
+        return self._lookups[keyword]
+
+    def _scan(self, keyword: str) -> Optional[str]:
+        for text, href in self.anchors:
+            if keyword in text:
+                return href
+        for title, url in self.next_data:
+            if keyword in title:
+                return url
+        return None
+
+
+def _parse_link_index(html_content: str) -> LinkIndex:
+    collector = _AnchorCollector()
+    collector.feed(html_content)
+    collector.close()
+    return LinkIndex(collector.anchors, _next_data_links(html_content))
+
+
+# Parse a Linktree page once; repeated calls for the same HTML are free.
+# Sized for one current page per tenant.
+build_link_index = ParsedPages(_parse_link_index, "parse_linktree", maxsize=64)
+
+
 def _find_link_by_text(html_content: str, keyword: str) -> Optional[str]:
-    soup = BeautifulSoup(html_content, "html.parser")
-    for a_tag in soup.find_all("a"):
-        text = a_tag.get_text()
-        if keyword in text:
-            return a_tag.get("href")
-    LOGGER.warning("No link found for keyword '%s'", keyword)
-    return None
+    link = build_link_index(html_content).find(keyword)
+    if link is None:
+        LOGGER.warning("No link found for keyword '%s'", keyword)
+    return link
 
 
 def find_bulletin_link(html_content: str) -> Optional[str]:
@@ -0,0 +1,306 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+The metric types cover what the bot needs (labelled counters, gauges and
+histograms) without adding a client library dependency. ``start_metrics_server``
+serves ``/metrics`` and the ``/healthz`` checks from a daemon thread so scrapes
+never touch the event loop.
+"""
+import contextlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_METRICS_ADDR = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9108
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+# (name, type, help, [(labels, value), ...]) produced by a collector at scrape time.
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextlib.contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the ``with`` block, including awaits inside it."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket",
+                                    {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_count", labels, cumulative))
+                samples.append((f"{self.name}_sum", labels, self._sums[key]))
+        return samples
+
+
+class MetricsRegistry:
+    """Holds metrics plus collectors that report live state at scrape time."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as exc:
+                LOGGER.error("Metrics collector %s failed: %s", collector, exc)
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "bulletin_bot_stage_seconds",
+    "Time spent in each hot-path stage (upstream fetches, parsing, downloads, Telegram sends).",
+    ("stage",),
+))
+RESOLVER_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "bulletin_bot_resolver_stage_seconds",
+    "Time spent in each document resolver stage.",
+    ("document", "stage"),
+))
+COMMAND_SECONDS = REGISTRY.register(Histogram(
+    "bulletin_bot_command_seconds",
+    "End-to-end time to answer a command.",
+    ("command",),
+))
+COMMANDS_IN_PROGRESS = REGISTRY.register(Gauge(
+    "bulletin_bot_commands_in_progress",
+    "Commands currently being answered.",
+    ("command",),
+))
+EVENT_LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    "bulletin_bot_event_loop_lag_seconds",
+    "How late the event loop woke from a timed sleep; high values mean blocked updates.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "bulletin_bot_startup_seconds",
+    "Seconds from process start to each startup phase, e.g. ready and first_update.",
+    ("phase",),
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "bulletin_bot_upstream_errors_total",
+    "Failed calls to Linktree, Google Drive or Telegram, by stage.",
+    ("stage",),
+))
+
+
+@contextlib.contextmanager
+def track_stage(stage: str, upstream: bool = True) -> Iterator[None]:
+    """Time a hot-path stage and count its failures as upstream errors."""
+    with STAGE_SECONDS.time(stage=stage):
+        try:
+            yield
+        except Exception:
+            if upstream:
+                UPSTREAM_ERRORS.inc(stage=stage)
+            raise
+
+
+HEALTH_CHECKS: Dict[str, Callable[[], bool]] = {}
+
+
+def register_health_check(name: str, check: Callable[[], bool]) -> None:
+    """Add a check to ``/healthz``; the endpoint returns 503 if any check fails."""
+    HEALTH_CHECKS[name] = check
+
+
+def health() -> Tuple[bool, Dict[str, bool]]:
+    results = {}
+    for name, check in list(HEALTH_CHECKS.items()):
+        try:
+            results[name] = bool(check())
+        except Exception as exc:
+            LOGGER.error("Health check %s failed: %s", name, exc)
+            results[name] = False
+    return all(results.values()), results
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._reply(200, "text/plain; version=0.0.4; charset=utf-8", REGISTRY.render())
+        elif path == "/healthz":
+            healthy, checks = health()
+            self._reply(200 if healthy else 503, "application/json",
+                        json.dumps({"status": "ok" if healthy else "unhealthy", "checks": checks}))
+        else:
+            self.send_error(404)
+
+    def _reply(self, status: int, content_type: str, text: str) -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        LOGGER.debug("metrics: " + format, *args)
+
+
+def start_metrics_server(port: Optional[int] = None,
+                         addr: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """Serve ``/metrics`` and ``/healthz`` on METRICS_ADDR:METRICS_PORT; a port of 0 disables it."""
+    port = port if port is not None else int(os.getenv("METRICS_PORT", DEFAULT_METRICS_PORT))
+    if port <= 0:
+        LOGGER.info("METRICS_PORT is 0; metrics endpoint disabled.")
+        return None
+    addr = addr or os.getenv("METRICS_ADDR", DEFAULT_METRICS_ADDR)
+    try:
+        server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    except OSError as exc:
+        LOGGER.error("Could not start metrics endpoint on %s:%s: %s", addr, port, exc)
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    LOGGER.info("Serving metrics and health on http://%s:%s/", addr, port)
+    return server
@@ -0,0 +1,76 @@
+"""Coalesce concurrent identical async operations into a single call."""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterator, Tuple, TypeVar
+
+from app.services.metrics import REGISTRY, MetricFamily
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome.
+
+    The first caller for a key becomes the leader and runs the operation.
+    Callers arriving while it is in flight await the leader's result (or
+    exception) instead of repeating the work.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, "asyncio.Future[Any]"] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    def counts(self) -> Dict[str, int]:
+        """Count in-flight calls by operation, the part of the key before ':'."""
+        counts: Dict[str, int] = {}
+        for key in list(self._calls):
+            operation = key.split(":", 1)[0]
+            counts[operation] = counts.get(operation, 0) + 1
+        return counts
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Return ``(result, shared)``; ``shared`` is True for non-leaders."""
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                LOGGER.info("Leader for %s was cancelled, retrying", key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when no one else was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+
+INFLIGHT = SingleFlight()
+
+
+def _inflight_metrics(flight: SingleFlight = INFLIGHT) -> Iterator[MetricFamily]:
+    yield ("bulletin_bot_inflight_operations", "gauge",
+           "Coalesced resolutions and uploads currently running.",
+           [({"operation": operation}, count) for operation, count in flight.counts().items()])
+
+
+REGISTRY.add_collector(_inflight_metrics)
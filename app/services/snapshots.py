@@ -0,0 +1,154 @@
+"""TTL-cached, conditionally revalidated snapshots of upstream pages."""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from app.services.http import get_async_client
+from app.services.metrics import track_stage
+from app.services.upstream import retry_upstream
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 300.0
+DEFAULT_STALE_SECONDS = 3600.0
+
+
+@dataclass
+class Snapshot:
+    """One fetched copy of an upstream page plus its validators."""
+
+    url: str
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+@retry_upstream
+async def _conditional_get(url: str, headers: Dict[str, str], timeout: float):
+    response = await get_async_client().get(url, headers=headers, timeout=timeout)
+    if response.status_code >= 500 or response.status_code == 429:
+        response.raise_for_status()
+    return response
+
+
+class SnapshotCache:
+    """Serve upstream pages from memory, refreshing at most once per TTL.
+
+    Fresh snapshots are returned directly. Once the TTL has passed the stale
+    copy is still returned for up to ``SNAPSHOT_STALE_SECONDS`` while a single
+    background task revalidates it with ETag/Last-Modified. Concurrent callers
+    that need a fetch share the same in-flight request.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 60,
+        ttl: Optional[float] = None,
+        stale: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self._timeout = timeout
+        self._ttl = ttl
+        self._stale = stale
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return float(os.getenv("SNAPSHOT_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+
+    @property
+    def stale(self) -> float:
+        if self._stale is not None:
+            return self._stale
+        return float(os.getenv("SNAPSHOT_STALE_SECONDS", DEFAULT_STALE_SECONDS))
+
+    def peek(self, url: str) -> Optional[Snapshot]:
+        """Return the stored snapshot for a URL without revalidating it."""
+        return self._snapshots.get(url)
+
+    def invalidate(self, url: Optional[str] = None) -> None:
+        """Drop one snapshot, or all of them when no URL is given."""
+        if url is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(url, None)
+
+    async def get(self, url: str, revalidate: bool = False) -> Snapshot:
+        """Return the snapshot for a URL; ``revalidate`` forces a conditional GET."""
+        snapshot = self._snapshots.get(url)
+        if snapshot is not None and not revalidate:
+            age = snapshot.age
+            if age < self.ttl:
+                return snapshot
+            if age < self.ttl + self.stale:
+                self._refresh(url)
+                return snapshot
+
+        try:
+            return await asyncio.shield(self._refresh(url))
+        except Exception as exc:
+            if snapshot is None:
+                raise
+            LOGGER.warning(
+                "Serving expired %s snapshot after refresh failed: %s", self.name, exc)
+            return snapshot
+
+    def _refresh(self, url: str) -> asyncio.Task:
+        task = self._refreshing.get(url)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._revalidate(url))
+            task.add_done_callback(self._refresh_done(url))
+            self._refreshing[url] = task
+        return task
+
+    def _refresh_done(self, url: str) -> Callable[[asyncio.Task], Any]:
+        def _callback(task: asyncio.Task) -> None:
+            if self._refreshing.get(url) is task:
+                del self._refreshing[url]
+            if not task.cancelled() and task.exception() is not None:
+                LOGGER.error("Refreshing %s snapshot failed: %s",
+                             self.name, task.exception())
+        return _callback
+
+    async def _revalidate(self, url: str) -> Snapshot:
+        previous = self._snapshots.get(url)
+        headers: Dict[str, str] = {}
+        if previous is not None:
+            if previous.etag:
+                headers["If-None-Match"] = previous.etag
+            if previous.last_modified:
+                headers["If-Modified-Since"] = previous.last_modified
+
+        with track_stage(f"{self.name}_fetch"):
+            response = await _conditional_get(url, headers, self._timeout)
+            if response.status_code == 304 and previous is not None:
+                LOGGER.info("%s snapshot not modified, extending TTL", self.name)
+                previous.fetched_at = time.monotonic()
+                return previous
+
+            response.raise_for_status()
+        snapshot = Snapshot(
+            url=url,
+            text=response.text,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+        )
+        self._snapshots[url] = snapshot
+        LOGGER.info("Fetched fresh %s snapshot from %s", self.name, url)
+        return snapshot
+
+
+LINKTREE_SNAPSHOTS = SnapshotCache("linktree", timeout=30)
+DRIVE_FOLDER_SNAPSHOTS = SnapshotCache("drive_folder", timeout=60)
@@ -0,0 +1,136 @@
+"""Chats subscribed to new-document announcements, plus the watcher's last-seen state."""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.services.cache_backends import DEFAULT_DB_PATH
+from app.utils.common import ensure_dir
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SubscriptionStore:
+    """Keeps subscriptions in memory and writes them through to SQLite once opened.
+
+    Subscriptions change rarely, so every change is committed immediately
+    rather than batched like CacheStore writes.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[str, Set[int]] = defaultdict(set)
+        self._last_seen: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self, path: str = DEFAULT_DB_PATH) -> None:
+        """Attach the SQLite file at ``path`` and load existing subscriptions."""
+        directory = os.path.dirname(path)
+        if directory:
+            ensure_dir(directory)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                chat_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (chat_id, kind)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS watch_state (
+                kind TEXT PRIMARY KEY,
+                identity TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.commit()
+        with self._lock:
+            self._conn = conn
+            for chat_id, kind in conn.execute("SELECT chat_id, kind FROM subscriptions"):
+                self._subscribers[kind].add(chat_id)
+            for kind, identity in conn.execute("SELECT kind, identity FROM watch_state"):
+                self._last_seen[kind] = identity
+        LOGGER.info("Loaded %d subscriptions", sum(
+            len(chats) for chats in self._subscribers.values()))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _execute(self, sql: str, rows: List[tuple]) -> None:
+        if self._conn is None or not rows:
+            return
+        with self._conn:
+            self._conn.executemany(sql, rows)
+
+    def subscribe(self, chat_id: int, kinds: Iterable[str]) -> List[str]:
+        """Subscribe a chat to the given kinds and return the ones that were new.
+
+        The kinds come from the caller, normally the keys of
+        ``app.documents.DOCUMENTS``; this module does not keep its own list.
+        """
+        now = time.time()
+        with self._lock:
+            added = [kind for kind in kinds if chat_id not in self._subscribers[kind]]
+            for kind in added:
+                self._subscribers[kind].add(chat_id)
+            self._execute(
+                "INSERT OR IGNORE INTO subscriptions (chat_id, kind, created_at) VALUES (?, ?, ?)",
+                [(chat_id, kind, now) for kind in added],
+            )
+        return added
+
+    def unsubscribe(self, chat_id: int, kinds: Optional[Iterable[str]] = None) -> List[str]:
+        """Remove a chat from the given kinds (default all) and return the ones it had."""
+        with self._lock:
+            if kinds is None:
+                kinds = list(self._subscribers)
+            removed = [kind for kind in kinds if chat_id in self._subscribers[kind]]
+            for kind in removed:
+                self._subscribers[kind].discard(chat_id)
+            self._execute(
+                "DELETE FROM subscriptions WHERE chat_id = ? AND kind = ?",
+                [(chat_id, kind) for kind in removed],
+            )
+        return removed
+
+    def subscribers(self, kind: str) -> List[int]:
+        with self._lock:
+            return sorted(self._subscribers.get(kind, ()))
+
+    def kinds_for(self, chat_id: int) -> List[str]:
+        with self._lock:
+            return [kind for kind, chats in self._subscribers.items() if chat_id in chats]
+
+    def get_last_seen(self, kind: str) -> Optional[str]:
+        with self._lock:
+            return self._last_seen.get(kind)
+
+    def set_last_seen(self, kind: str, identity: str) -> None:
+        with self._lock:
+            self._last_seen[kind] = identity
+            self._execute(
+                "INSERT OR REPLACE INTO watch_state (kind, identity, updated_at) VALUES (?, ?, ?)",
+                [(kind, identity, time.time())],
+            )
+
+
+SUBSCRIPTIONS = SubscriptionStore()
+
+
+def open_persistent_subscriptions(store: SubscriptionStore = SUBSCRIPTIONS) -> None:
+    """Persist subscriptions next to the cache unless CACHE_BACKEND=memory."""
+    if os.getenv("CACHE_BACKEND", "sqlite").lower() == "memory":
+        return
+    store.open(os.getenv("CACHE_DB_PATH", DEFAULT_DB_PATH))
@@ -0,0 +1,296 @@
+"""Per-host concurrency limits, rate limits and circuit breakers for upstream calls.
+
+Every request made through the shared async client passes through
+``GuardedTransport``. It looks up the ``Upstream`` for the request's host, then:
+- waits for a concurrency slot (held until the response body is closed);
+- waits for a token from the host's bucket;
+- fails fast with ``CircuitOpenError`` while the host's breaker is open.
+
+Callers that have a cached copy (e.g. ``SnapshotCache``) keep serving it
+while the circuit is open.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, TypeVar
+
+import httpx
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+from app.services.metrics import REGISTRY, MetricFamily
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_HOST = "default"
+DEFAULT_CONCURRENCY = {
+    "linktr.ee": 4,
+    "drive.google.com": 8,
+    "drive.usercontent.google.com": 4,
+    DEFAULT_HOST: 8,
+}
+# Sustained requests per second; bursts of twice that are allowed.
+DEFAULT_RATES = {
+    "linktr.ee": 5.0,
+    "drive.google.com": 10.0,
+    "drive.usercontent.google.com": 5.0,
+    DEFAULT_HOST: 10.0,
+}
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+
+
+def host_settings(env_name: str, defaults: Dict[str, T], cast: Callable[[str], T]) -> Dict[str, T]:
+    """Parse a "host=value,host=value" environment variable over ``defaults``."""
+    values = dict(defaults)
+    for pair in os.getenv(env_name, "").split(","):
+        host, _, value = pair.strip().partition("=")
+        if not host or not value:
+            continue
+        try:
+            values[host.strip()] = cast(value)
+        except ValueError:
+            LOGGER.warning("Ignoring invalid %s value for %s: %s", env_name, host, value)
+    return values
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+    def __init__(self, upstream: str, retry_in: float) -> None:
+        super().__init__(f"{upstream} is unavailable, retrying in {retry_in:.0f}s")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """Allow ``rate`` acquisitions per second on average, ``burst`` at once."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate * 2)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """Open after ``failure_threshold`` consecutive failures, probe again after ``reset_seconds``.
+
+    While half-open a single trial request is let through; its outcome closes
+    the circuit or opens it for another ``reset_seconds``.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_seconds: float = DEFAULT_RESET_SECONDS) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_request(self) -> None:
+        """Raise CircuitOpenError unless a request may go out now."""
+        if self.state == self.CLOSED:
+            return
+        waited = time.monotonic() - self._opened_at
+        if self.state == self.OPEN and waited >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        raise CircuitOpenError(self.name, max(0.0, self.reset_seconds - waited))
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            LOGGER.info("Circuit for %s closed", self.name)
+        self.state = self.CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                LOGGER.warning("Circuit for %s opened after %d failures", self.name, self._failures)
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def abandon_trial(self) -> None:
+        """Let another request probe the upstream after a trial was cancelled."""
+        self._trial_in_flight = False
+
+
+class Upstream:
+    """Concurrency slots, rate limit and circuit breaker for one host."""
+
+    def __init__(self, name: str, concurrency: int, rate: float,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_seconds: float = DEFAULT_RESET_SECONDS) -> None:
+        self.name = name
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_seconds)
+        self.in_flight = 0
+
+    async def acquire(self) -> None:
+        self.breaker.before_request()
+        # A half-open trial cancelled while waiting for a slot or token must
+        # be handed back, or the breaker would wait for it forever.
+        trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            await self.semaphore.acquire()
+            self.in_flight += 1
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                self.release()
+                raise
+        except BaseException:
+            if trial:
+                self.breaker.abandon_trial()
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.semaphore.release()
+
+
+_UPSTREAMS: Dict[str, Upstream] = {}
+
+
+def upstream_for(host: Optional[str]) -> Upstream:
+    """Return the shared Upstream for a host, creating it from the environment on first use."""
+    concurrency = host_settings("UPSTREAM_CONCURRENCY", DEFAULT_CONCURRENCY, int)
+    name = host if host in concurrency else DEFAULT_HOST
+    upstream = _UPSTREAMS.get(name)
+    if upstream is None:
+        rates = host_settings("UPSTREAM_RATE", DEFAULT_RATES, float)
+        upstream = _UPSTREAMS[name] = Upstream(
+            name,
+            concurrency=concurrency[name],
+            rate=rates.get(name, rates[DEFAULT_HOST]),
+            failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD)),
+            reset_seconds=float(os.getenv("CIRCUIT_RESET_SECONDS", DEFAULT_RESET_SECONDS)),
+        )
+    return upstream
+
+
+def _is_failure(status_code: int) -> bool:
+    return status_code >= 500 or status_code == 429
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that frees the upstream's concurrency slot once closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, upstream: Upstream) -> None:
+        self._stream = stream
+        self._upstream = upstream
+        self._released = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._upstream.release()
+
+
+class GuardedTransport(httpx.AsyncBaseTransport):
+    """Apply the request host's Upstream limits around another transport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        upstream = upstream_for(request.url.host)
+        await upstream.acquire()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as exc:
+            upstream.release()
+            if isinstance(exc, httpx.TransportError):
+                upstream.breaker.record_failure()
+            else:
+                upstream.breaker.abandon_trial()
+            raise
+        if _is_failure(response.status_code):
+            upstream.breaker.record_failure()
+        else:
+            upstream.breaker.record_success()
+        if isinstance(response.stream, httpx.ByteStream):
+            # Body already in memory (e.g. a mocked or cached response).
+            upstream.release()
+        else:
+            response.stream = _ReleasingStream(response.stream, upstream)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, CircuitOpenError):
+        return False
+    response = getattr(exc, "response", None)
+    status_code = getattr(response, "status_code", None)
+    if status_code is not None:
+        return _is_failure(status_code)
+    if isinstance(exc, httpx.TransportError):
+        return True
+    # requests is only imported by the sync helpers; without it the error can't be one of its.
+    requests = sys.modules.get("requests")
+    return requests is not None and isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+# Three attempts with exponential backoff (0.5s, 1s, ... capped at 8s) plus
+# up to a second of jitter so retries from concurrent handlers spread out.
+retry_upstream = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=0.5, max=8, jitter=1),
+    retry=retry_if_exception(_is_retryable),
+    reraise=True,
+)
+
+
+def _upstream_metrics() -> Iterator[MetricFamily]:
+    upstreams = list(_UPSTREAMS.values())
+    yield ("bulletin_bot_upstream_circuit_open", "gauge",
+           "1 while the upstream's circuit breaker is rejecting requests.",
+           [({"upstream": upstream.name}, float(upstream.breaker.state != CircuitBreaker.CLOSED))
+            for upstream in upstreams])
+    yield ("bulletin_bot_upstream_requests_in_flight", "gauge",
+           "Requests holding one of the upstream's concurrency slots.",
+           [({"upstream": upstream.name}, upstream.in_flight) for upstream in upstreams])
+
+
+REGISTRY.add_collector(_upstream_metrics)
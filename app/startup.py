@@ -0,0 +1,61 @@
+"""Startup timing and the background load of the persisted caches.
+
+``app.main`` imports this module first, so ``STARTED_AT`` is as close to
+process start as Python code gets. ``mark`` logs each startup phase and
+exports it as ``bulletin_bot_startup_seconds{phase}``. The persisted caches
+are read on a thread while python-telegram-bot is imported and the bot
+logs in, and ``wait_for_caches`` joins it before the first update is
+handled.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+STARTED_AT = time.monotonic()
+
+logger = logging.getLogger(__name__)
+
+_PHASES: Dict[str, float] = {}
+_PRELOAD: Optional[threading.Thread] = None
+
+
+def mark(phase: str) -> float:
+    """Record and log the seconds since process start for ``phase``, once."""
+    if phase in _PHASES:
+        return _PHASES[phase]
+    elapsed = time.monotonic() - STARTED_AT
+    _PHASES[phase] = elapsed
+    # Imported here: this module must stay cheap to import.
+    from app.services.metrics import STARTUP_SECONDS
+    STARTUP_SECONDS.set(elapsed, phase=phase)
+    logger.info("Startup: %s after %.0f ms", phase, elapsed * 1000)
+    return elapsed
+
+
+def preload_caches(*loaders: Callable[[], None]) -> None:
+    """Run ``loaders`` (e.g. open_persistent_cache) on a background thread."""
+    global _PRELOAD
+
+    def load() -> None:
+        for loader in loaders:
+            try:
+                loader()
+            except Exception:
+                logger.exception("Preloading with %s failed", loader.__name__)
+        mark("caches_loaded")
+
+    _PRELOAD = threading.Thread(target=load, name="cache-preload", daemon=True)
+    _PRELOAD.start()
+
+
+async def wait_for_caches() -> None:
+    """Wait for ``preload_caches`` so handlers and jobs see the persisted entries."""
+    if _PRELOAD is not None:
+        import asyncio
+        await asyncio.to_thread(_PRELOAD.join)
+
+
+async def first_update(update: object, context: object) -> None:
+    """Group -1 handler: note when the first update arrives, then stay out of the way."""
+    mark("first_update")
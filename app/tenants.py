@@ -0,0 +1,128 @@
+"""Tenants: the congregations, each with its own Linktree and Drive folder, served by one bot.
+
+By default there is a single tenant built from ``LINKTREE_URL``,
+``OUTLINE_FOLDER_URL`` and ``CACHE_CHAT_ID``. ``TENANTS_FILE`` points at a
+JSON file listing more tenants and the chats that belong to each::
+
+    {"tenants": [{"key": "stjohns", "name": "St John's",
+                  "linktree_url": "https://linktr.ee/stjohns",
+                  "outline_folder_url": "https://drive.google.com/drive/folders/...",
+                  "cache_chat_id": -1001234567890,
+                  "chats": [123456789, -1009876543210]}]}
+
+Chats that are not listed get the default tenant. All tenants share the
+HTTP pools, snapshot caches, CacheStore and JobQueue jobs. ``use_tenant``
+scopes CacheStore keys so one tenant's file_ids never answer another's
+commands.
+"""
+import contextlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterator, List, Optional, Union
+
+from app.services.cache import cache_scope
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+ChatId = Union[int, str]
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """One congregation's document sources."""
+
+    key: str
+    name: str
+    linktree_url: Optional[str] = None
+    outline_folder_url: Optional[str] = None
+    cache_chat_id: Optional[ChatId] = None
+    chats: FrozenSet[int] = field(default_factory=frozenset)
+
+    @property
+    def is_default(self) -> bool:
+        return self.key == DEFAULT_TENANT
+
+    def scoped(self, name: str) -> str:
+        """Namespace a key by tenant; the default tenant keeps unprefixed keys."""
+        return name if self.is_default else f"{self.key}:{name}"
+
+
+_TENANTS: Dict[str, Tenant] = {}
+_CHAT_TENANTS: Dict[int, str] = {}
+
+
+def _chat_id(value: Optional[Union[int, str]]) -> Optional[ChatId]:
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _default_tenant_from_env() -> Tenant:
+    # Read on every call: .env is loaded after this module is imported.
+    return Tenant(
+        key=DEFAULT_TENANT,
+        name=os.getenv("TENANT_NAME", "Bukit Arang"),
+        linktree_url=os.getenv("LINKTREE_URL") or None,
+        outline_folder_url=os.getenv("OUTLINE_FOLDER_URL") or None,
+        cache_chat_id=_chat_id(os.getenv("CACHE_CHAT_ID")),
+    )
+
+
+def register_tenant(tenant: Tenant) -> Tenant:
+    _TENANTS[tenant.key] = tenant
+    for chat_id in tenant.chats:
+        _CHAT_TENANTS[chat_id] = tenant.key
+    return tenant
+
+
+def load_tenants(path: Optional[str] = None) -> List[Tenant]:
+    """Register the tenants listed in ``path`` (default ``TENANTS_FILE``), if any."""
+    path = path or os.getenv("TENANTS_FILE")
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as handle:
+        config = json.load(handle)
+
+    loaded = []
+    for entry in config.get("tenants", []):
+        loaded.append(register_tenant(Tenant(
+            key=entry["key"],
+            name=entry.get("name", entry["key"]),
+            linktree_url=entry.get("linktree_url"),
+            outline_folder_url=entry.get("outline_folder_url"),
+            cache_chat_id=_chat_id(entry.get("cache_chat_id")),
+            chats=frozenset(int(chat_id) for chat_id in entry.get("chats", ())),
+        )))
+    logger.info("Loaded %d tenants from %s", len(loaded), path)
+    return loaded
+
+
+def default_tenant() -> Tenant:
+    return _TENANTS.get(DEFAULT_TENANT) or _default_tenant_from_env()
+
+
+def all_tenants() -> List[Tenant]:
+    """Every tenant, the default one first."""
+    return [default_tenant()] + [
+        tenant for key, tenant in _TENANTS.items() if key != DEFAULT_TENANT]
+
+
+def tenant_for_chat(chat_id: Optional[int]) -> Tenant:
+    key = _CHAT_TENANTS.get(chat_id) if chat_id is not None else None
+    if key is None or key == DEFAULT_TENANT:
+        return default_tenant()
+    return _TENANTS[key]
+
+
+@contextlib.contextmanager
+def use_tenant(tenant: Tenant) -> Iterator[Tenant]:
+    """Read and write the tenant's CacheStore keys inside the block."""
+    with cache_scope("" if tenant.is_default else tenant.key):
+        yield tenant
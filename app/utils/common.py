@@ -11,3 +11,8 @@ def ensure_dir(path: str) -> None:
 def get_file_checksum(content: bytes) -> str:
     """Return the MD5 checksum for the provided content."""
     return hashlib.md5(content).hexdigest()
+
+
+def new_checksum():
+    """Return an incremental MD5 hasher matching get_file_checksum."""
+    return hashlib.md5()
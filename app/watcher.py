@@ -0,0 +1,155 @@
+"""Background watcher that pushes new documents to subscribed chats.
+
+Every ``WATCH_INTERVAL_SECONDS`` the watcher revalidates every tenant's
+Linktree and Drive folder snapshots and compares the current bulletin/songbook
+links and outline file ids with the last ones it saw for that tenant. A
+changed document is resolved and uploaded once, then its Telegram file_id is
+fanned out to every subscriber in rate-limited batches.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from telegram import Bot
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from telegram.ext import Application, ContextTypes
+
+from app.documents import DOCUMENTS, locate_document, resolve_document, tenant_documents
+from app.services.subscriptions import SUBSCRIPTIONS
+from app.tenants import Tenant, all_tenants, default_tenant, tenant_for_chat
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCH_INTERVAL_SECONDS = 600
+# Telegram allows roughly 30 messages per second across all chats.
+DEFAULT_FANOUT_RATE = 25
+
+
+async def current_documents(tenant: Optional[Tenant] = None) -> Dict[str, Optional[str]]:
+    """Return the identity (link or Drive id) of each of a tenant's documents right now."""
+    tenant = tenant or default_tenant()
+    sources = tenant_documents(tenant)
+    identities = await asyncio.gather(
+        *(locate_document(source, revalidate=True, tenant=tenant) for source in sources),
+        return_exceptions=True,
+    )
+    documents: Dict[str, Optional[str]] = {}
+    for source, identity in zip(sources, identities):
+        if isinstance(identity, Exception):
+            logger.error("Watcher could not locate %s: %s", tenant.scoped(source.kind), identity)
+        else:
+            documents[source.kind] = identity
+    return documents
+
+
+async def _deliver(bot: Bot, chat_id: int, file_id: str, caption: str) -> bool:
+    for attempt in range(2):
+        try:
+            await bot.send_document(chat_id, document=file_id, caption=caption)
+            return True
+        except RetryAfter as exc:
+            delay = exc.retry_after
+            delay = delay.total_seconds() if hasattr(delay, "total_seconds") else delay
+            logger.warning("Flood limit hit sending to %s, waiting %ss", chat_id, delay)
+            await asyncio.sleep(delay)
+        except Forbidden:
+            logger.info("Chat %s blocked the bot, unsubscribing", chat_id)
+            SUBSCRIPTIONS.unsubscribe(chat_id)
+            return False
+        except TelegramError as exc:
+            logger.error("Failed to deliver to %s: %s", chat_id, exc)
+            return False
+    return False
+
+
+async def fan_out(bot: Bot, chat_ids: List[int], file_id: str, caption: str,
+                  rate: Optional[int] = None) -> int:
+    """Send a file_id to many chats, at most ``rate`` sends per second."""
+    rate = rate or int(os.getenv("FANOUT_RATE", DEFAULT_FANOUT_RATE))
+    loop = asyncio.get_running_loop()
+    delivered = 0
+    for start in range(0, len(chat_ids), rate):
+        started = loop.time()
+        batch = chat_ids[start:start + rate]
+        results = await asyncio.gather(
+            *(_deliver(bot, chat_id, file_id, caption) for chat_id in batch))
+        delivered += sum(results)
+        if start + rate < len(chat_ids):
+            await asyncio.sleep(max(0.0, 1.0 - (loop.time() - started)))
+    return delivered
+
+
+async def announce(bot: Bot, kind: str, chat_ids: List[int],
+                   tenant: Optional[Tenant] = None) -> bool:
+    """Resolve a tenant's document once and push it to ``chat_ids``."""
+    tenant = tenant or default_tenant()
+    upload_chat = tenant.cache_chat_id
+    if upload_chat is None:
+        # Without a cache chat the first subscriber receives the upload.
+        upload_chat = chat_ids[0]
+    announcement = DOCUMENTS[kind].messages.announcement
+    uploaded_to = []
+
+    async def send(**kwargs):
+        kwargs.setdefault("caption", announcement)
+        sent_message = await bot.send_document(upload_chat, **kwargs)
+        uploaded_to.append(upload_chat)
+        return sent_message
+
+    file_id = (await resolve_document(
+        DOCUMENTS[kind], send, resend_cached=False, tenant=tenant)).file_id
+    if not file_id:
+        logger.error("Could not resolve %s for subscribers", tenant.scoped(kind))
+        return False
+
+    recipients = [chat_id for chat_id in chat_ids if chat_id not in uploaded_to]
+    delivered = await fan_out(bot, recipients, file_id, announcement)
+    logger.info("Announced new %s to %d/%d subscribers",
+                tenant.scoped(kind), delivered + len(uploaded_to), len(chat_ids))
+    return True
+
+
+async def _watch_tenant(bot: Bot, tenant: Tenant, documents: Dict[str, Optional[str]]) -> None:
+    for kind, identity in documents.items():
+        if not identity:
+            continue
+        state_key = tenant.scoped(kind)
+        previous = SUBSCRIPTIONS.get_last_seen(state_key)
+        if previous == identity:
+            continue
+        chat_ids = [chat_id for chat_id in SUBSCRIPTIONS.subscribers(kind)
+                    if tenant_for_chat(chat_id).key == tenant.key]
+        if previous is not None and chat_ids:
+            logger.info("Detected new %s: %s", state_key, identity)
+            try:
+                if not await announce(bot, kind, chat_ids, tenant):
+                    continue
+            except Exception as exc:
+                logger.error("Announcing %s failed: %s", state_key, exc)
+                continue
+        SUBSCRIPTIONS.set_last_seen(state_key, identity)
+
+
+async def watch_documents(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback: diff every tenant's upstream documents and announce changes."""
+    tenants = all_tenants()
+    current = await asyncio.gather(*(current_documents(tenant) for tenant in tenants))
+    await asyncio.gather(*(_watch_tenant(context.bot, tenant, documents)
+                           for tenant, documents in zip(tenants, current)))
+
+
+def schedule_watcher(application: Application) -> None:
+    """Register the change-detection job on the application's JobQueue."""
+    interval = float(os.getenv("WATCH_INTERVAL_SECONDS", DEFAULT_WATCH_INTERVAL_SECONDS))
+    if interval <= 0:
+        logger.info("WATCH_INTERVAL_SECONDS is 0; subscription watcher disabled.")
+        return
+    job_queue = application.job_queue
+    if job_queue is None:
+        logger.warning(
+            "JobQueue unavailable; install python-telegram-bot[job-queue] to enable /subscribe pushes.")
+        return
+    job_queue.run_repeating(watch_documents, interval=interval,
+                            first=min(interval, 60), name="watch_documents")
+    logger.info("Watching for new documents every %ss", interval)
@@ -0,0 +1,78 @@
+"""How the bot receives updates: long polling (default) or a webhook.
+
+Setting ``WEBHOOK_URL`` switches to webhook mode. Telegram then POSTs each
+update to ``WEBHOOK_URL/WEBHOOK_PATH`` as soon as it arrives. python-telegram-bot
+serves the endpoint on ``WEBHOOK_LISTEN:WEBHOOK_PORT`` and rejects requests
+without the secret token. Both modes process up to ``CONCURRENT_UPDATES``
+updates at once and flush the caches on shutdown through ``post_shutdown``.
+"""
+import importlib.util
+import logging
+import os
+import secrets
+from typing import Any, Dict, Optional, Union
+
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENT_UPDATES = 32
+DEFAULT_WEBHOOK_LISTEN = "0.0.0.0"
+DEFAULT_WEBHOOK_PORT = 8443
+DEFAULT_WEBHOOK_PATH = "telegram"
+DEFAULT_WEBHOOK_MAX_CONNECTIONS = 40
+
+
+def concurrent_updates() -> Union[bool, int]:
+    """Return the ApplicationBuilder.concurrent_updates setting; 1 or less is sequential."""
+    limit = int(os.getenv("CONCURRENT_UPDATES", DEFAULT_CONCURRENT_UPDATES))
+    return limit if limit > 1 else False
+
+
+def webhook_settings() -> Optional[Dict[str, Any]]:
+    """Return run_webhook keyword arguments, or None to use polling."""
+    public_url = os.getenv("WEBHOOK_URL")
+    if not public_url:
+        return None
+
+    url_path = os.getenv("WEBHOOK_PATH", DEFAULT_WEBHOOK_PATH).strip("/")
+    secret_token = os.getenv("WEBHOOK_SECRET_TOKEN")
+    if not secret_token:
+        # Telegram echoes the token back on every request; a per-start random
+        # one still keeps strangers from posting fake updates.
+        secret_token = secrets.token_urlsafe(32)
+        logger.info("WEBHOOK_SECRET_TOKEN not set; generated one for this run.")
+
+    return {
+        "listen": os.getenv("WEBHOOK_LISTEN", DEFAULT_WEBHOOK_LISTEN),
+        "port": int(os.getenv("WEBHOOK_PORT", DEFAULT_WEBHOOK_PORT)),
+        "url_path": url_path,
+        "webhook_url": f"{public_url.rstrip('/')}/{url_path}",
+        "secret_token": secret_token,
+        "cert": os.getenv("WEBHOOK_CERT") or None,
+        "key": os.getenv("WEBHOOK_KEY") or None,
+        "max_connections": int(
+            os.getenv("WEBHOOK_MAX_CONNECTIONS", DEFAULT_WEBHOOK_MAX_CONNECTIONS)),
+    }
+
+
+def missing_webhook_support() -> Optional[str]:
+    """Explain why webhook mode can't start, or return None if it can (or isn't configured)."""
+    if not os.getenv("WEBHOOK_URL") or importlib.util.find_spec("tornado") is not None:
+        return None
+    return ("WEBHOOK_URL is set but the webhook server is not installed; "
+            "install python-telegram-bot[webhooks] or unset WEBHOOK_URL to use polling.")
+
+
+def run_application(application: Application) -> None:
+    """Block serving updates via webhook when configured, else via polling."""
+    settings = webhook_settings()
+    if settings is None:
+        logger.info("Starting in polling mode")
+        application.run_polling()
+        return
+
+    logger.info("Starting webhook on %s:%s/%s for %s (TLS %s)",
+                settings["listen"], settings["port"], settings["url_path"],
+                settings["webhook_url"], "on" if settings["cert"] else "terminated upstream")
+    application.run_webhook(**settings)
@@ -0,0 +1,136 @@
+"""End-to-end latency of the document commands against recorded upstreams.
+
+Usage:
+    python -m benchmarks.bench_handlers [--users 20] [--iterations 10]
+
+The command handlers from app/bot.py run against a local server replaying
+benchmarks/fixtures and a fake Telegram bot, in three scenarios:
+
+cold
+    Every cache is cleared before each command.
+warm
+    Caches are primed, so commands should be file_id resends.
+concurrent
+    ``--users`` chats send every command at once into cleared caches.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Sequence
+
+from benchmarks.harness import (
+    LINKTREE_URL,
+    OUTLINE_FOLDER_URL,
+    FakeBot,
+    FixtureServer,
+    fake_update,
+    local_client,
+    percentile,
+    reset_caches,
+)
+
+
+def _report(scenario: str, latencies: Dict[str, List[float]], wall: float) -> None:
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"{scenario} ({total} commands, {total / wall:.1f} commands/s)")
+    for kind, samples in latencies.items():
+        print(f"  {kind:<12} n={len(samples):<4} "
+              f"p50 {percentile(samples, 0.5) * 1000:8.1f} ms  "
+              f"p99 {percentile(samples, 0.99) * 1000:8.1f} ms")
+
+
+async def _timed(handler, update, context) -> float:
+    started = time.perf_counter()
+    await handler(update, context)
+    return time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.bot import document_command
+    from app.documents import DOCUMENTS
+    from app.services.http import close_async_client, install_async_client
+
+    kinds: Sequence[str] = args.documents or list(DOCUMENTS)
+    handlers = {kind: document_command(DOCUMENTS[kind]) for kind in kinds}
+
+    server = FixtureServer(latency=args.upstream_latency / 1000,
+                           pdf_bytes=args.pdf_kib * 1024).start()
+    install_async_client(local_client(server.port))
+    # Telegram's servers fetch URL documents, so the bot's upstream limits don't apply.
+    telegram_client = local_client(server.port, guarded=False)
+    bot = FakeBot(telegram_client, latency=args.telegram_latency / 1000)
+
+    try:
+        latencies: Dict[str, List[float]] = {kind: [] for kind in kinds}
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            for kind, handler in handlers.items():
+                reset_caches()
+                latencies[kind].append(await _timed(handler, *fake_update(bot, 1, f"/{kind}")))
+        _report("cold", latencies, time.perf_counter() - started)
+
+        for kind, handler in handlers.items():
+            await handler(*fake_update(bot, 1, f"/{kind}"))
+        latencies = {kind: [] for kind in kinds}
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            for kind, handler in handlers.items():
+                latencies[kind].append(await _timed(handler, *fake_update(bot, 1, f"/{kind}")))
+        _report("warm", latencies, time.perf_counter() - started)
+
+        reset_caches()
+        latencies = {kind: [] for kind in kinds}
+        jobs = [(kind, handler, fake_update(bot, chat_id, f"/{kind}"))
+                for chat_id in range(1, args.users + 1) for kind, handler in handlers.items()]
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(_timed(handler, *update_context) for _, handler, update_context in jobs))
+        wall = time.perf_counter() - started
+        for (kind, _, _), elapsed in zip(jobs, results):
+            latencies[kind].append(elapsed)
+        _report(f"concurrent ({args.users} users)", latencies, wall)
+
+        print("upstream requests:", ", ".join(
+            f"{name}={count}" for name, count in sorted(server.requests.items())))
+        print("bot API calls:", ", ".join(
+            f"{name}={count}" for name, count in sorted(bot.calls.items())))
+    finally:
+        await close_async_client()
+        await telegram_client.aclose()
+        server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("documents", nargs="*", help="Commands to run (default: all)")
+    parser.add_argument("-n", "--iterations", type=int, default=10)
+    parser.add_argument("-u", "--users", type=int, default=20)
+    parser.add_argument("--upstream-latency", type=float, default=20,
+                        help="Milliseconds added to every upstream response")
+    parser.add_argument("--telegram-latency", type=float, default=50,
+                        help="Milliseconds added to every Bot API call")
+    parser.add_argument("--pdf-kib", type=int, default=1024, help="Size of each served PDF")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Keep the bot's INFO logs")
+    args = parser.parse_args()
+
+    os.environ.update(LINKTREE_URL=LINKTREE_URL, OUTLINE_FOLDER_URL=OUTLINE_FOLDER_URL,
+                      CACHE_BACKEND="memory", METRICS_PORT="0")
+    workdir = tempfile.mkdtemp(prefix="bench-handlers-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app.bot  # noqa: F401  configures logging on import
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+        asyncio.run(run(args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare the old BeautifulSoup link scan with the single-pass LinkIndex.
+
+Usage:
+    python -m benchmarks.bench_linktree [saved_linktree.html ...]
+
+Without arguments the bundled fixture in benchmarks/fixtures is used.
+"""
+import argparse
+import os
+import timeit
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+from app.services.linktree import build_link_index
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "linktree.html")
+KEYWORDS = ("Sunday Bulletin", "Songbook")
+
+
+def beautifulsoup_find(html_content: str, keyword: str) -> Optional[str]:
+    """The pre-index implementation: build a full DOM per lookup."""
+    soup = BeautifulSoup(html_content, "html.parser")
+    for a_tag in soup.find_all("a"):
+        if keyword in a_tag.get_text():
+            return a_tag.get("href")
+    return None
+
+
+def _per_call_ms(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1000
+
+
+def bench_page(path: str, number: int) -> None:
+    with open(path, "r", encoding="utf-8") as handle:
+        html = handle.read()
+
+    for keyword in KEYWORDS:
+        expected = beautifulsoup_find(html, keyword)
+        build_link_index.cache_clear()
+        actual = build_link_index(html).find(keyword)
+        if actual != expected:
+            raise SystemExit(f"{path}: {keyword!r} mismatch: {actual!r} != {expected!r}")
+
+    def soup_both():
+        for keyword in KEYWORDS:
+            beautifulsoup_find(html, keyword)
+
+    def index_cold():
+        build_link_index.cache_clear()
+        for keyword in KEYWORDS:
+            build_link_index(html).find(keyword)
+
+    def index_warm():
+        for keyword in KEYWORDS:
+            build_link_index(html).find(keyword)
+
+    soup_ms = _per_call_ms(soup_both, number)
+    cold_ms = _per_call_ms(index_cold, number)
+    warm_ms = _per_call_ms(index_warm, number * 100)
+    print(f"{os.path.basename(path)} ({len(html) / 1024:.0f} KiB, both lookups)")
+    print(f"  beautifulsoup      {soup_ms:9.3f} ms")
+    print(f"  link index (cold)  {cold_ms:9.3f} ms  {soup_ms / cold_ms:6.1f}x")
+    print(f"  link index (warm)  {warm_ms:9.4f} ms  {soup_ms / warm_ms:6.0f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", default=[FIXTURE])
+    parser.add_argument("-n", "--number", type=int, default=20)
+    args = parser.parse_args()
+    for path in args.pages:
+        bench_page(path, args.number)
+
+
+if __name__ == "__main__":
+    main()
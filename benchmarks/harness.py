@@ -0,0 +1,287 @@
+"""Offline stand-ins for Linktree, Google Drive and Telegram.
+
+``FixtureServer`` replays the recorded pages in benchmarks/fixtures from a
+local HTTP server, and ``LocalUpstreamTransport`` sends every upstream request
+there regardless of its host, so the service layer runs unchanged against
+real sockets. ``FakeBot`` and ``fake_update`` stand in for the Telegram side
+of a handler.
+"""
+import asyncio
+import itertools
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from telegram.error import BadRequest
+
+from app.services.cache import CACHE
+from app.services.drive import build_drive_index
+from app.services.http import default_headers
+from app.services.linktree import build_link_index
+from app.services.snapshots import DRIVE_FOLDER_SNAPSHOTS, LINKTREE_SNAPSHOTS
+from app.services.upstream import GuardedTransport
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+LINKTREE_URL = "https://linktr.ee/babulletin-fixture"
+OUTLINE_FOLDER_URL = "https://drive.google.com/drive/folders/1OutlineFolderFixture0000000000"
+
+
+def _read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as handle:
+        return handle.read()
+
+
+class FixtureServer:
+    """Serve the recorded upstream responses on 127.0.0.1.
+
+    Routes are matched on the path only, the way the real hosts lay them out:
+    the Linktree page, the Drive folder listing, a file's view page, the
+    viewerng JSON and the PDF bytes behind both download and direct links.
+    ``latency`` delays every response to model a remote upstream, and PDFs
+    are padded to ``pdf_bytes`` with a per-file marker so each document
+    hashes differently.
+    """
+
+    def __init__(self, latency: float = 0.0, pdf_bytes: int = 1024 * 1024) -> None:
+        self.latency = latency
+        self.pdf_bytes = pdf_bytes
+        self.linktree = _read_fixture("linktree.html")
+        self.folder = _read_fixture("drive_folder.html")
+        self.file_view = _read_fixture("drive_file_view.html").decode("utf-8")
+        self.viewerng = _read_fixture("viewerng.json").decode("utf-8")
+        self.pdf = _read_fixture("sample.pdf")
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def pdf_for(self, file_id: str) -> bytes:
+        marker = f"\n% {file_id}\n".encode("ascii")
+        padding = max(0, self.pdf_bytes - len(self.pdf) - len(marker))
+        return self.pdf + marker + b"%" * padding
+
+    def route(self, path: str, query: Dict[str, List[str]]):
+        """Return ``(route, status, content_type, body, headers)`` for a request."""
+        file_id = query.get("id", [""])[0]
+        if path.startswith("/drive/folders/"):
+            return "drive_folder", 200, "text/html; charset=utf-8", self.folder, {}
+        if path.startswith("/file/d/"):
+            file_id = path.split("/")[3]
+            body = self.file_view.replace("{file_id}", file_id).encode("utf-8")
+            return "drive_view", 200, "text/html; charset=utf-8", body, {}
+        if path.startswith("/viewerng/"):
+            body = self.viewerng.replace("{file_id}", file_id).encode("utf-8")
+            return "viewerng", 200, "application/json; charset=utf-8", body, {}
+        if path in ("/uc", "/viewer/pdf"):
+            headers = {"Content-Disposition": f'attachment; filename="{file_id}.pdf"'}
+            return "pdf", 200, "application/pdf", self.pdf_for(file_id), headers
+        if path.count("/") == 1 and len(path) > 1:
+            return "linktree", 200, "text/html; charset=utf-8", self.linktree, {}
+        return "missing", 404, "text/plain", b"not found", {}
+
+    def start(self) -> "FixtureServer":
+        fixture_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                name, status, content_type, body, headers = fixture_server.route(
+                    url.path, parse_qs(url.query))
+                with fixture_server._lock:
+                    fixture_server.requests[name] = fixture_server.requests.get(name, 0) + 1
+                if fixture_server.latency:
+                    time.sleep(fixture_server.latency)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fixture-server",
+                         daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class LocalUpstreamTransport(httpx.AsyncBaseTransport):
+    """Send every request to the fixture server, keeping path and query."""
+
+    def __init__(self, port: int, max_connections: int = 100) -> None:
+        self._port = port
+        self._transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=max_connections))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self._port)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def local_client(port: int, guarded: bool = True) -> httpx.AsyncClient:
+    """Client routed to the fixture server; ``guarded`` applies the bot's per-host limits."""
+    transport = LocalUpstreamTransport(port)
+    return httpx.AsyncClient(
+        headers=default_headers(),
+        follow_redirects=True,
+        timeout=60,
+        # Outermost, so the guards see the original upstream host.
+        transport=GuardedTransport(transport) if guarded else transport,
+    )
+
+
+class FakeBot:
+    """Minimal Bot API stand-in with a fixed per-call latency.
+
+    URL documents are fetched through ``client`` the way Telegram's servers
+    would, uploads are read to the end, and file_ids are only accepted if
+    this bot issued them.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, latency: float = 0.05) -> None:
+        self.client = client
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self._file_ids = set()
+        self._ids = itertools.count(1)
+
+    def _count(self, method: str) -> None:
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> "FakeMessage":
+        self._count("sendMessage")
+        await asyncio.sleep(self.latency)
+        return FakeMessage(self, chat_id, text=text)
+
+    async def edit_message_text(self, text: str, chat_id: int, message_id: int, **kwargs) -> None:
+        self._count("editMessageText")
+        await asyncio.sleep(self.latency)
+
+    async def delete_message(self, chat_id: int, message_id: int) -> None:
+        self._count("deleteMessage")
+        await asyncio.sleep(self.latency)
+
+    async def send_chat_action(self, chat_id: int, action: str, **kwargs) -> None:
+        self._count("sendChatAction")
+        await asyncio.sleep(self.latency)
+
+    async def send_document(self, chat_id: int, document, filename: Optional[str] = None,
+                            **kwargs) -> "FakeMessage":
+        await asyncio.sleep(self.latency)
+        return await self._receive(chat_id, document, "sendDocument")
+
+    async def send_media_group(self, chat_id: int, media, **kwargs) -> List["FakeMessage"]:
+        """Accept a group of InputMediaDocument items in a single call."""
+        await asyncio.sleep(self.latency)
+        return [await self._receive(chat_id, item.media, "sendMediaGroup") for item in media]
+
+    async def _receive(self, chat_id: int, document, method: str) -> "FakeMessage":
+        if isinstance(document, str) and document.startswith(("http://", "https://")):
+            self._count(f"{method}(url)")
+            response = await self.client.get(document)
+            if response.status_code != 200:
+                raise BadRequest("Wrong file identifier/http url specified")
+        elif isinstance(document, str):
+            self._count(f"{method}(file_id)")
+            if document not in self._file_ids:
+                raise BadRequest("Wrong file identifier/http url specified")
+            return FakeMessage(self, chat_id, document=SimpleNamespace(file_id=document))
+        else:
+            self._count(f"{method}(upload)")
+            # InputMediaDocument wraps open files in an InputFile.
+            if not hasattr(document, "input_file_content"):
+                document.read()
+        file_id = f"fixture-file-{next(self._ids)}"
+        self._file_ids.add(file_id)
+        return FakeMessage(self, chat_id, document=SimpleNamespace(file_id=file_id))
+
+
+class FakeMessage:
+    """The subset of telegram.Message the handlers call."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, bot: FakeBot, chat_id: int, text: Optional[str] = None,
+                 document=None) -> None:
+        self._bot = bot
+        self.chat_id = chat_id
+        self.message_id = next(self._ids)
+        self.text = text
+        self.document = document
+        self.chat = SimpleNamespace(id=chat_id, type="private")
+
+    def get_bot(self) -> FakeBot:
+        return self._bot
+
+    async def reply_text(self, text: str, **kwargs) -> "FakeMessage":
+        return await self._bot.send_message(self.chat_id, text, **kwargs)
+
+    async def reply_document(self, document=None, **kwargs) -> "FakeMessage":
+        return await self._bot.send_document(self.chat_id, document, **kwargs)
+
+    async def reply_media_group(self, media, **kwargs) -> List["FakeMessage"]:
+        return await self._bot.send_media_group(self.chat_id, media, **kwargs)
+
+    async def reply_chat_action(self, action: str, **kwargs) -> None:
+        await self._bot.send_chat_action(self.chat_id, action, **kwargs)
+
+    async def edit_text(self, text: str, **kwargs) -> None:
+        await self._bot.edit_message_text(text, self.chat_id, self.message_id, **kwargs)
+
+    async def delete(self) -> None:
+        await self._bot.delete_message(self.chat_id, self.message_id)
+
+
+def fake_update(bot: FakeBot, chat_id: int, text: str):
+    """Return an (update, context) pair for a command sent from ``chat_id``."""
+    message = FakeMessage(bot, chat_id, text=text)
+    update = SimpleNamespace(
+        message=message,
+        effective_message=message,
+        effective_chat=message.chat,
+        effective_user=SimpleNamespace(id=chat_id),
+    )
+    context = SimpleNamespace(bot=bot, args=text.split()[1:])
+    return update, context
+
+
+def reset_caches() -> None:
+    """Forget everything a previous run cached, for cold-start measurements."""
+    CACHE.clear_all()
+    LINKTREE_SNAPSHOTS.invalidate()
+    DRIVE_FOLDER_SNAPSHOTS.invalidate()
+    build_link_index.cache_clear()
+    build_drive_index.cache_clear()
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    if not ordered:
+        return math.nan
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]